@@ -0,0 +1,221 @@
+import json
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cost_guard import QueryCostExceeded, guard_query
+from .engine_registry import engine_registry
+from .execution import execute_query
+from .llm import ainvoke_llm
+from .prompts import assemble_sql_prompt, build_answer_prompt, clean_sql
+from .renderers import COLUMNAR_MEDIA_TYPE, accepts_columnar, render_columnar
+from .result_digest import build_digest
+from .schema_cache import schema_cache
+from .sql_cache import cache_key as sql_cache_key, sql_cache
+from .views import SMALL_TALK
+
+
+# Blocking work (engine checkout, reflection, queries, cache ORM lookups,
+# result digests) runs here so the event loop only ever waits on it.
+db_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_DB_THREADS, thread_name_prefix="text2sql-db"
+)
+
+
+def run_db(func):
+    return sync_to_async(func, thread_sensitive=False, executor=db_executor)
+
+
+def json_response(payload, status, request=None):
+    layout = accepts_columnar(request.headers.get("Accept")) if request is not None else None
+    if layout is not None:
+        return HttpResponse(render_columnar(payload, layout), status=status, content_type=COLUMNAR_MEDIA_TYPE)
+    return JsonResponse(payload, status=status, encoder=JSONEncoder)
+
+
+def read_payload(request):
+    """The JSON object in the request body; {} for invalid JSON or a non-object."""
+    try:
+        payload = json.loads(request.body or b"{}")
+    except ValueError:
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+async def get_connected_engine(request):
+    return await run_db(engine_registry.engine_for)(request.session)
+
+
+@csrf_exempt
+@require_POST
+async def askdb_async(request):
+    """
+    url:- async/ask-db/
+    doc :- Async version of ask-db/ for ASGI deployments. The LLM call is
+           awaited and database work runs in a bounded thread pool, so one
+           worker can serve many questions at once.
+    payload: { "question": "What is the average percentage of students?" }
+    """
+    try:
+        engine = await get_connected_engine(request)
+        if engine is None:
+            return json_response({
+                "error": True,
+                "status_code": 400,
+                "message": "Database not connected. Please call connect-db first.",
+                "data": None
+            }, status=400)
+
+        api_key = await request.session.aget("api_key")
+        if not api_key:
+            return json_response({
+                "error": True,
+                "status_code": 400,
+                "message": "No API key found. Please set your API key first.",
+                "data": None
+            }, status=400)
+
+        payload = read_payload(request)
+        question = payload.get("question")
+        if not question:
+            return json_response({
+                "error": True,
+                "status_code": 400,
+                "message": "Missing question field",
+                "data": None
+            }, status=400)
+
+        if question.lower().strip() in SMALL_TALK:
+            return json_response({
+                "error": False,
+                "status_code": 200,
+                "message": "Acknowledged",
+                "data": None
+            }, status=200)
+
+        entry = await run_db(schema_cache.get)(engine)
+        prompt, tables, _ = await run_db(assemble_sql_prompt)(entry, question)
+
+        cache_key = sql_cache_key(question, entry)
+        bypass_cache = bool(payload.get("bypass_cache"))
+        sql_query = None if bypass_cache else await run_db(sql_cache.get)(cache_key)
+        cached = sql_query is not None
+        usage = None
+
+        if not cached:
+            text, usage = await ainvoke_llm(api_key, "generate_sql", prompt)
+            sql_query = clean_sql(text)
+            if sql_query:
+                await run_db(sql_cache.set)(cache_key, question, sql_query)
+
+        await request.session.aset("last_question", question)
+        await request.session.aset("last_query", sql_query)
+
+        return json_response({
+            "error": False,
+            "status_code": 200,
+            "message": "SQL query generated successfully",
+            "data": {"query": sql_query, "selected_tables": tables, "cached": cached, "usage": usage}
+        }, status=200)
+
+    except Exception as e:
+        print("ERROR in askdb_async:", str(e))
+        traceback.print_exc()
+        return json_response({
+            "error": True,
+            "status_code": 500,
+            "message": f"Failed to process question: {str(e)}",
+            "data": None
+        }, status=500)
+
+
+@csrf_exempt
+@require_POST
+async def execute_db_async(request):
+    """
+    url:- async/execute-db/
+    doc :- Async version of execute-db/ for ASGI deployments. Supports the
+           same columnar Accept format as execute-db/.
+    payload (optional): { "page_size": 100, "confirm": true }
+    """
+    try:
+        engine = await get_connected_engine(request)
+        if engine is None:
+            return json_response({
+                "error": True,
+                "status_code": 400,
+                "message": "Database not connected. Please call connect-db first.",
+                "data": None
+            }, status=400)
+
+        api_key = await request.session.aget("api_key")
+        if not api_key:
+            return json_response({
+                "error": True,
+                "status_code": 400,
+                "message": "No API key found. Please set your API key first.",
+                "data": None
+            }, status=400)
+
+        sql_query = await request.session.apop("last_query", None)
+        user_question = await request.session.apop("last_question", None)
+        if sql_query:
+            await request.session.aset("last_executed_query", sql_query)
+        if not sql_query or not user_question:
+            return json_response({
+                "error": True,
+                "status_code": 400,
+                "message": "No query found. Please call ask-db first.",
+                "data": None
+            }, status=400)
+
+        payload = read_payload(request)
+        try:
+            sql_query, cost_estimate = await run_db(guard_query)(
+                engine, sql_query, bool(payload.get("confirm"))
+            )
+        except QueryCostExceeded as e:
+            if e.confirmable:
+                await request.session.aset("last_query", sql_query)
+                await request.session.aset("last_question", user_question)
+            status = 409 if e.confirmable else 400
+            return json_response({
+                "error": True,
+                "status_code": status,
+                "message": str(e),
+                "data": {"cost_estimate": e.estimate, "confirm_required": e.confirmable}
+            }, status=status)
+
+        data, next_page, script = await run_db(execute_query)(engine, sql_query, payload.get("page_size"))
+        digest = await run_db(build_digest)(data, more_rows=next_page is not None)
+
+        answer, usage = await ainvoke_llm(api_key, "explain", build_answer_prompt(user_question, sql_query, digest))
+        answer = answer.strip()
+
+        return json_response({
+            "error": False,
+            "status_code": 200,
+            "message": "Query executed successfully",
+            "data": {
+                "rows": data,
+                "nl_answer": answer,
+                "next_page": next_page,
+                "script": script,
+                "cost_estimate": cost_estimate,
+                "usage": usage
+            }
+        }, status=200, request=request)
+
+    except Exception as e:
+        return json_response({
+            "error": True,
+            "status_code": 500,
+            "message": f"Failed to execute query: {str(e)}",
+            "data": None
+        }, status=500)
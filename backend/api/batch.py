@@ -0,0 +1,59 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .pipeline import elapsed_ms, generate_sql
+
+
+def generate_one(api_key, schema_entry, question, bypass_cache=False):
+    """
+    Generate SQL for one question of a batch, retrying failed LLM calls with
+    exponential backoff. Never raises; failures are reported in the result.
+    """
+    from tenacity import Retrying, retry_if_not_exception_type, stop_after_attempt, wait_exponential
+
+    started = time.perf_counter()
+    result = {
+        "question": question,
+        "query": None,
+        "selected_tables": [],
+        "cached": False,
+        "error": None,
+        "attempts": 0,
+        "usage": None,
+    }
+    retrying = Retrying(
+        stop=stop_after_attempt(settings.BATCH_MAX_ATTEMPTS),
+        wait=wait_exponential(multiplier=settings.BATCH_RETRY_BACKOFF, max=settings.BATCH_RETRY_MAX_WAIT),
+        # ValueError means the question itself cannot be prompted; retrying won't help
+        retry=retry_if_not_exception_type(ValueError),
+        reraise=True,
+    )
+    try:
+        for attempt in retrying:
+            with attempt:
+                result["attempts"] = attempt.retry_state.attempt_number
+                sql_query, tables, cached, usage = generate_sql(
+                    api_key, schema_entry, question, bypass_cache, rate_limited=True
+                )
+        result.update(query=sql_query, selected_tables=tables, cached=cached, usage=usage)
+    except Exception as e:
+        result["error"] = str(e)
+    result["latency_ms"] = elapsed_ms(started)
+    return result
+
+
+def generate_batch(api_key, schema_entry, questions, concurrency=None, bypass_cache=False):
+    """
+    Generate SQL for every question against one schema entry, running up to
+    `concurrency` (default BATCH_CONCURRENCY) LLM calls at a time.
+    Returns the per-question results in the order of `questions`.
+    """
+    concurrency = min(concurrency or settings.BATCH_CONCURRENCY, settings.BATCH_CONCURRENCY, len(questions))
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="text2sql-batch") as pool:
+        futures = [
+            pool.submit(generate_one, api_key, schema_entry, question, bypass_cache)
+            for question in questions
+        ]
+        return [future.result() for future in futures]
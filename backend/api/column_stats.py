@@ -0,0 +1,214 @@
+import datetime
+import decimal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from sqlalchemy import text
+
+from .schema_cache import connection_key, schema_cache
+from .tokens import count_tokens
+
+
+RANGE_TYPES = (int, float, decimal.Decimal, datetime.date, datetime.time)
+
+profiler_executor = ThreadPoolExecutor(
+    max_workers=settings.COLUMN_STATS_THREADS, thread_name_prefix="text2sql-profile"
+)
+
+
+def sample_query(conn, engine, table, columns):
+    """
+    A bounded sample of `table`: TABLESAMPLE SYSTEM on PostgreSQL tables
+    larger than COLUMN_STATS_SAMPLE_ROWS, a LIMIT scan everywhere else.
+    """
+    preparer = engine.dialect.identifier_preparer
+    limit = settings.COLUMN_STATS_SAMPLE_ROWS
+    select = f"SELECT {', '.join(preparer.quote(c) for c in columns)} FROM {preparer.quote(table)}"
+    if engine.dialect.name == "postgresql":
+        estimate = conn.execute(
+            text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:name)"),
+            {"name": preparer.quote(table)},
+        ).scalar()
+        if estimate and estimate > limit:
+            # Twice the pages needed, since SYSTEM sampling picks whole pages
+            percent = min(100.0, 200.0 * limit / estimate)
+            return f"{select} TABLESAMPLE SYSTEM ({percent:.4f}) LIMIT {limit}"
+    return f"{select} LIMIT {limit}"
+
+
+def sample_rows(engine, table, columns):
+    with engine.connect() as conn:
+        return conn.execute(text(sample_query(conn, engine, table, columns))).fetchall()
+
+
+def profile_column(values):
+    """Null ratio, min/max and (for enum-like columns) the distinct values."""
+    present = [value for value in values if value is not None]
+    stats = {"null_ratio": 1 - len(present) / len(values) if values else 0.0}
+    if not present:
+        return stats
+    if isinstance(present[0], RANGE_TYPES) and not isinstance(present[0], bool):
+        try:
+            stats["min"], stats["max"] = min(present), max(present)
+        except TypeError:  # mixed types
+            pass
+    if isinstance(present[0], (str, int, decimal.Decimal)) and not isinstance(present[0], bool):
+        try:
+            distinct = set(present)
+        except TypeError:
+            return stats
+        # Enum-like: few values, each seen more than once in the sample
+        if (
+            len(distinct) <= settings.COLUMN_STATS_MAX_VALUES
+            and len(present) >= 2 * len(distinct)
+            and all(len(str(value)) <= settings.COLUMN_STATS_MAX_VALUE_LENGTH for value in distinct)
+        ):
+            stats["values"] = sorted(distinct, key=str)
+    return stats
+
+
+def profile_table(engine, table, columns):
+    """{column: stats} from a sample of `table`, plus the sample size."""
+    rows = sample_rows(engine, table, columns)
+    return {name: profile_column([row[i] for row in rows]) for i, name in enumerate(columns)}, len(rows)
+
+
+def format_value(value):
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def format_stats(table, stats, sampled):
+    """Compact comment appended to the table's DDL in the SQL prompt."""
+    lines = []
+    for column, column_stats in stats.items():
+        parts = []
+        if "values" in column_stats:
+            parts.append(", ".join(format_value(value) for value in column_stats["values"]))
+        elif "min" in column_stats:
+            parts.append(f"{format_value(column_stats['min'])} to {format_value(column_stats['max'])}")
+        if column_stats["null_ratio"]:
+            parts.append(f"{column_stats['null_ratio']:.0%} null")
+        if parts:
+            lines.append(f"{column}: {'; '.join(parts)}")
+    if not lines:
+        return ""
+    return "/*\n" + f"Column stats for {table} (sample of {sampled} rows):\n" + "\n".join(lines) + "\n*/"
+
+
+def is_due(entry, table, now):
+    stats = entry.column_stats.get(table)
+    return stats is None or now - stats[2] > settings.COLUMN_STATS_REFRESH
+
+
+class ColumnProfiler:
+    """
+    Keeps sampled column statistics of connected databases on their schema
+    cache entries, off the request path.
+
+    A connection is profiled once its schema is reflected, then every
+    COLUMN_STATS_CHECK_INTERVAL seconds a timer re-profiles tables whose
+    statistics are missing (new or changed tables) or older than
+    COLUMN_STATS_REFRESH. A table that fails to profile is recorded with an
+    empty note and retried on the same schedule. Connections whose schema entry was evicted are
+    dropped.
+    """
+
+    def __init__(self):
+        self._engines = {}   # connection key -> engine
+        self._running = set()
+        self._timer = None
+        self.tables_profiled = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def track(self, engine):
+        """Profile `engine` in the background now and on the refresh schedule."""
+        key = connection_key(engine)
+        with self._lock:
+            self._engines[key] = engine
+            if self._timer is None:
+                self._timer = threading.Thread(target=self._tick, name="text2sql-profile-timer", daemon=True)
+                self._timer.start()
+        self._submit(key, engine, wait_for_schema=True)
+
+    def _submit(self, key, engine, wait_for_schema=False):
+        with self._lock:
+            if key in self._running:
+                return
+            self._running.add(key)
+        profiler_executor.submit(self._run, key, engine, wait_for_schema)
+
+    def _run(self, key, engine, wait_for_schema):
+        try:
+            # get() waits for a warm-up in progress rather than reflecting again
+            entry = schema_cache.get(engine) if wait_for_schema else schema_cache.peek(engine)
+            if entry is None:
+                return
+            now = time.time()
+            for table in [table for table in entry.tables if is_due(entry, table, now)]:
+                try:
+                    stats, sampled = profile_table(engine, table, entry.table_meta[table]["columns"])
+                except Exception:
+                    with self._lock:
+                        self.failures += 1
+                    # No note, but a timestamp: retried after COLUMN_STATS_REFRESH
+                    # instead of on every check
+                    entry.column_stats[table] = ("", 0, time.time())
+                    continue
+                note = format_stats(table, stats, sampled)
+                entry.column_stats[table] = (note, count_tokens(note) if note else 0, time.time())
+                with self._lock:
+                    self.tables_profiled += 1
+        except Exception:
+            with self._lock:
+                self.failures += 1
+        finally:
+            with self._lock:
+                self._running.discard(key)
+
+    def _tick(self):
+        while True:
+            time.sleep(settings.COLUMN_STATS_CHECK_INTERVAL)
+            now = time.time()
+            with self._lock:
+                engines = list(self._engines.items())
+            for key, engine in engines:
+                entry = schema_cache.peek(engine)
+                if entry is None:
+                    with self._lock:
+                        self._engines.pop(key, None)
+                elif any(is_due(entry, table, now) for table in entry.tables):
+                    self._submit(key, engine)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "connections": len(self._engines),
+                "running": len(self._running),
+                "tables_profiled": self.tables_profiled,
+                "failures": self.failures,
+            }
+
+
+column_profiler = ColumnProfiler()
+
+
+def stats_note(entry, table):
+    """The cached column statistics note of `table`, or ""."""
+    if not settings.COLUMN_STATS_IN_PROMPT:
+        return ""
+    stats = entry.column_stats.get(table)
+    return stats[0] if stats else ""
+
+
+def stats_tokens(entry, table):
+    if not settings.COLUMN_STATS_IN_PROMPT:
+        return 0
+    stats = entry.column_stats.get(table)
+    return stats[1] if stats else 0
@@ -0,0 +1,166 @@
+import json
+
+import sqlparse
+from django.conf import settings
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from .metrics import timed
+from .pagination import has_top_level_limit, has_top_level_offset, parse_select
+from .script import split_statements
+from .sql_utils import strip_statement
+
+
+# Statement types the planner can estimate without running them.
+EXPLAINABLE_TYPES = {"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE"}
+
+
+class QueryCostExceeded(Exception):
+    """
+    The planner's estimate for a statement is over the cost guard thresholds.
+    `confirmable` is True when the statement may still run if the caller
+    confirms it, False when it is rejected outright.
+    """
+
+    def __init__(self, estimate, confirmable):
+        self.estimate = estimate
+        self.confirmable = confirmable
+        if confirmable:
+            message = "Query is estimated to be expensive. Repeat the request with \"confirm\": true to run it."
+        else:
+            message = "Query rejected: its estimated cost exceeds the allowed limit."
+        super().__init__(message)
+
+
+def explainable(sql_query):
+    statements = [s for s in sqlparse.parse(sql_query) if s.token_first(skip_cm=True)]
+    return len(statements) == 1 and statements[0].get_type() in EXPLAINABLE_TYPES
+
+
+def postgres_estimate(conn, sql_query):
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql_query}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    plan = plan[0]["Plan"]
+    return {"rows": int(plan["Plan Rows"]), "cost": float(plan["Total Cost"])}
+
+
+def mysql_plan_rows(node):
+    """Largest per-join row estimate of any table in a MySQL JSON plan."""
+    rows = 0
+    if isinstance(node, dict):
+        table = node.get("table")
+        if isinstance(table, dict):
+            rows = max(
+                float(table.get("rows_produced_per_join") or 0),
+                float(table.get("rows_examined_per_scan") or 0),
+            )
+        for value in node.values():
+            rows = max(rows, mysql_plan_rows(value))
+    elif isinstance(node, list):
+        for value in node:
+            rows = max(rows, mysql_plan_rows(value))
+    return rows
+
+
+def mysql_estimate(conn, sql_query):
+    plan = json.loads(conn.execute(text(f"EXPLAIN FORMAT=JSON {sql_query}")).scalar())
+    query_block = plan["query_block"]
+    cost = float(query_block.get("cost_info", {}).get("query_cost") or 0)
+    return {"rows": int(mysql_plan_rows(query_block)), "cost": cost}
+
+
+ESTIMATORS = {
+    "postgresql": postgres_estimate,
+    "mysql": mysql_estimate,
+}
+
+
+def estimate_cost(engine, sql_query):
+    """
+    Planner estimate {"rows", "cost"} for `sql_query`, or None when the
+    dialect has no estimator, the statement cannot be EXPLAINed, or EXPLAIN
+    fails (the statement itself will then report the error).
+    """
+    estimator = ESTIMATORS.get(engine.dialect.name)
+    if estimator is None or not explainable(sql_query):
+        return None
+    try:
+        with engine.connect() as conn:
+            return estimator(conn, strip_statement(sql_query))
+    except (DBAPIError, KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+def over_threshold(estimate):
+    return (
+        estimate["rows"] > settings.COST_GUARD_MAX_ROWS
+        or estimate["cost"] > settings.COST_GUARD_MAX_COST
+    )
+
+
+def add_limit(sql_query, limit):
+    """
+    `sql_query` with a top-level LIMIT, or None if it cannot take one.
+    Comments are stripped first so a trailing `-- ...` can't swallow it;
+    a query with its own OFFSET is wrapped, as LIMIT can't follow OFFSET.
+    """
+    statement = parse_select(sql_query)
+    if statement is None or has_top_level_limit(statement):
+        return None
+    sql_query = strip_statement(sqlparse.format(sql_query, strip_comments=True))
+    if has_top_level_offset(statement):
+        return f"SELECT * FROM ({sql_query}) AS _limited LIMIT {int(limit)}"
+    return f"{sql_query} LIMIT {int(limit)}"
+
+
+@timed("cost_guard")
+def guard_query(engine, sql_query, confirmed=False):
+    """
+    Check `sql_query` against the cost guard before it runs.
+
+    Returns (SQL to run, planner estimate or None). Over the thresholds,
+    COST_GUARD_ACTION decides: "reject" raises QueryCostExceeded, "limit"
+    adds LIMIT COST_GUARD_LIMIT_ROWS to SELECTs (anything else needs
+    confirmation), and "confirm" raises QueryCostExceeded unless `confirmed`.
+
+    Every statement of a multi-statement script is checked on its own; the
+    estimate returned is that of the most expensive one, with its
+    1-based "statement" number.
+    """
+    if not settings.COST_GUARD_ENABLED:
+        return sql_query, None
+    statements = split_statements(sql_query)
+    if len(statements) <= 1:
+        return guard_statement(engine, sql_query, confirmed)
+
+    guarded = []
+    worst = None
+    for number, statement in enumerate(statements, 1):
+        try:
+            statement, estimate = guard_statement(engine, statement, confirmed)
+        except QueryCostExceeded as e:
+            e.estimate = {**e.estimate, "statement": number}
+            raise
+        guarded.append(statement)
+        if estimate is not None and (worst is None or estimate["cost"] > worst["cost"]):
+            worst = {**estimate, "statement": number}
+    return ";\n".join(guarded), worst
+
+
+def guard_statement(engine, sql_query, confirmed=False):
+    """guard_query for a single statement."""
+    estimate = estimate_cost(engine, sql_query)
+    if estimate is None or not over_threshold(estimate):
+        return sql_query, estimate
+
+    action = settings.COST_GUARD_ACTION
+    if action == "reject":
+        raise QueryCostExceeded(estimate, confirmable=False)
+    if action == "limit":
+        limited = add_limit(sql_query, settings.COST_GUARD_LIMIT_ROWS)
+        if limited is not None:
+            return limited, {**estimate, "limited_to": settings.COST_GUARD_LIMIT_ROWS}
+    if confirmed:
+        return sql_query, estimate
+    raise QueryCostExceeded(estimate, confirmable=True)
@@ -1,4 +1,10 @@
-from langchain_community.utilities import SQLDatabase
+import base64
+import hashlib
+
+from cryptography.fernet import Fernet
+from django.conf import settings
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 
 def build_connection_url(db_type, user, password, host, port, database):
     if db_type == "mysql":
@@ -9,9 +15,55 @@ def build_connection_url(db_type, user, password, host, port, database):
         raise ValueError("Unsupported database type. Use 'mysql' or 'postgresql'.")
 
 
+def statement_timeout_args(backend, timeout_ms):
+    """DBAPI connect arguments that set a per-connection statement timeout."""
+    if not timeout_ms:
+        return {}
+    if backend == "postgresql":
+        return {"options": f"-c statement_timeout={int(timeout_ms)}"}
+    if backend == "mysql":
+        return {"init_command": f"SET SESSION MAX_EXECUTION_TIME={int(timeout_ms)}"}
+    return {}
+
+
+def engine_options(connection_url):
+    """Pool options from settings; SQLite's default pools take no sizing."""
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    backend = make_url(connection_url).get_backend_name()
+    if backend != "sqlite":
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_POOL_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    connect_args = statement_timeout_args(backend, settings.DB_STATEMENT_TIMEOUT_MS)
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
 def connect_database(connection_url):
     try:
-        db = SQLDatabase.from_uri(connection_url)
-        return db
+        engine = create_engine(connection_url, **engine_options(connection_url))
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return engine
     except Exception as e:
-        raise ConnectionError(f"Failed to connect: {str(e)}")
\ No newline at end of file
+        raise ConnectionError(f"Failed to connect: {str(e)}")
+
+
+def _fernet():
+    key = settings.CONNECTION_ENCRYPTION_KEY or settings.SECRET_KEY
+    return Fernet(base64.urlsafe_b64encode(hashlib.sha256(key.encode()).digest()))
+
+
+def encrypt_connection_url(connection_url):
+    """Encrypt a connection URL (it carries credentials) for storage in the session."""
+    return _fernet().encrypt(connection_url.encode()).decode()
+
+
+def decrypt_connection_url(token):
+    return _fernet().decrypt(token.encode()).decode()
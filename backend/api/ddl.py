@@ -0,0 +1,90 @@
+import sqlparse
+from sqlparse import tokens as T
+
+from .result_cache import referenced_tables
+
+
+# Statements that can change a table definition. TRUNCATE, which sqlparse
+# also tags as DDL, only removes rows.
+DDL_VERBS = {"CREATE", "ALTER", "DROP", "RENAME", "COMMENT"}
+# Objects whose DDL names the tables it changes (CREATE INDEX ... ON t).
+TABLE_KINDS = {"TABLE", "INDEX"}
+# Objects that never show up in the reflected schema.
+IGNORED_KINDS = {"VIEW", "FUNCTION", "PROCEDURE", "TRIGGER", "SEQUENCE", "ROLE", "USER", "EVENT"}
+KNOWN_KINDS = TABLE_KINDS | IGNORED_KINDS | {"COLUMN"}
+
+
+def statement_verb(statement):
+    first = statement.token_first(skip_cm=True)
+    return first.normalized.split()[0] if first is not None else None
+
+
+def statement_kind(statement):
+    """The kind of object a DDL statement acts on (TABLE, INDEX, COLUMN, ...)."""
+    kind = None
+    for token in statement.flatten():
+        if token.ttype in T.Name:
+            break
+        if token.ttype in T.Keyword and token.ttype not in T.Keyword.DDL:
+            if token.normalized in KNOWN_KINDS:
+                return token.normalized
+            kind = kind or token.normalized
+    return kind
+
+
+def renamed_to(statement):
+    """Names on either side of TO, i.e. the old and new names of renames."""
+    names = set()
+    after_to = False
+    last_name = None
+    for token in statement.flatten():
+        if token.is_whitespace or token.ttype in T.Comment:
+            continue
+        if token.ttype in T.Name or token.ttype in T.String.Symbol:
+            last_name = token.value.strip('`"[]').lower()
+            if after_to:
+                names.add(last_name)
+            continue
+        if token.match(T.Punctuation, "."):
+            continue
+        if token.match(T.Keyword, "TO") and last_name is not None:
+            names.add(last_name)  # RENAME TABLE a TO b, c TO d: the old names
+        after_to = token.match(T.Keyword, "TO")
+        last_name = None
+    return names
+
+
+def column_table(statement):
+    """Table part of the first qualified name, as in COMMENT ON COLUMN t.c."""
+    parts = []
+    for token in statement.flatten():
+        if token.ttype in T.Name or token.ttype in T.String.Symbol:
+            parts.append(token.value.strip('`"[]').lower())
+        elif parts and not token.match(T.Punctuation, "."):
+            break
+    return parts[-2] if len(parts) >= 2 else None
+
+
+def ddl_tables(sql_query):
+    """
+    Tables whose definition a script changes. Returns (is_ddl, tables):
+    tables is a set of lower-cased names, or None when the script contains
+    DDL whose targets can't be told (DROP SCHEMA, ALTER TYPE, ...).
+    """
+    is_ddl = False
+    tables = set()
+    for statement in sqlparse.parse(sql_query):
+        if statement_verb(statement) not in DDL_VERBS:
+            continue
+        is_ddl = True
+        kind = statement_kind(statement)
+        if kind in TABLE_KINDS:
+            tables |= referenced_tables(str(statement)) | renamed_to(statement)
+        elif kind == "COLUMN":
+            table = column_table(statement)
+            if table is None:
+                return True, None
+            tables.add(table)
+        elif kind not in IGNORED_KINDS:
+            return True, None
+    return is_ddl, tables
@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import OrderedDict
+
+from cryptography.fernet import InvalidToken
+from django.conf import settings
+from sqlalchemy.engine import make_url
+
+from .db_utils import connect_database, decrypt_connection_url, encrypt_connection_url
+from .schema_cache import schema_cache
+
+
+SESSION_KEY = "db_connection"
+
+
+def normalize_url(connection_url):
+    """
+    Canonical form of a connection URL, so sessions pointing at the same
+    database share one engine regardless of case or query-string order.
+    """
+    url = make_url(connection_url)
+    url = url.set(
+        drivername=url.drivername.lower(),
+        host=url.host.lower() if url.host else url.host,
+        query=dict(sorted(url.query.items())),
+    )
+    return url.render_as_string(hide_password=False)
+
+
+class EngineRegistry:
+    """
+    Process-wide registry of pooled SQLAlchemy engines.
+
+    Engines are deduplicated by normalized connection URL. Entries idle for
+    longer than ENGINE_REGISTRY_IDLE_TTL, or beyond the
+    ENGINE_REGISTRY_MAX_ENGINES least recently used ones, are evicted and
+    their pools disposed.
+
+    The session itself stores the encrypted connection URL, so whichever
+    worker receives a request can rebuild the engine; the per-worker session
+    map only caches the decrypted URL.
+    """
+
+    def __init__(self):
+        self._engines = OrderedDict()   # url -> [engine, last_used]
+        self._sessions = OrderedDict()  # session_id -> [token, url, last_used]
+        self._lock = threading.RLock()
+        self.created = 0
+        self.evicted = 0
+
+    def register(self, session, connection_url):
+        """Connect `session` to a database and return its engine."""
+        url = normalize_url(connection_url)
+        engine = self._acquire(url)
+        token = encrypt_connection_url(url)
+        session[SESSION_KEY] = token
+        self._bind(session.session_key, token, url)
+        return engine
+
+    def engine_for(self, session):
+        """Return the engine bound to `session`, or None if not connected."""
+        token = session.get(SESSION_KEY)
+        if not token:
+            return None
+        session_id = session.session_key
+        with self._lock:
+            binding = self._sessions.get(session_id)
+            if binding is not None and binding[0] == token:
+                binding[2] = time.monotonic()
+                self._sessions.move_to_end(session_id)
+                url = binding[1]
+            else:
+                url = None
+        if url is None:
+            # First request for this session on this worker: rehydrate.
+            try:
+                url = decrypt_connection_url(token)
+            except InvalidToken:
+                return None
+            self._bind(session_id, token, url)
+        return self._acquire(url)
+
+    def _bind(self, session_id, token, url):
+        with self._lock:
+            self._sessions[session_id] = [token, url, time.monotonic()]
+            self._sessions.move_to_end(session_id)
+            self._evict()
+
+    def _acquire(self, url):
+        with self._lock:
+            entry = self._engines.get(url)
+            if entry is not None:
+                entry[1] = time.monotonic()
+                self._engines.move_to_end(url)
+                return entry[0]
+
+        engine = connect_database(url)
+        with self._lock:
+            entry = self._engines.get(url)
+            if entry is not None:
+                # Another thread won the race; keep its engine.
+                engine.dispose()
+            else:
+                entry = self._engines[url] = [engine, time.monotonic()]
+                self.created += 1
+            entry[1] = time.monotonic()
+            self._engines.move_to_end(url)
+            self._evict()
+            return entry[0]
+
+    def _evict(self):
+        now = time.monotonic()
+        session_ttl = settings.ENGINE_REGISTRY_SESSION_TTL
+        while self._sessions:
+            session_id, (token, url, last_used) = next(iter(self._sessions.items()))
+            if now - last_used <= session_ttl:
+                break
+            del self._sessions[session_id]
+
+        idle_ttl = settings.ENGINE_REGISTRY_IDLE_TTL
+        max_engines = settings.ENGINE_REGISTRY_MAX_ENGINES
+        while self._engines:
+            url, (engine, last_used) = next(iter(self._engines.items()))
+            if len(self._engines) <= max_engines and now - last_used <= idle_ttl:
+                break
+            del self._engines[url]
+            engine.dispose()
+            schema_cache.invalidate(engine)
+            self.evicted += 1
+
+    def stats(self):
+        with self._lock:
+            engines = [entry[0] for entry in self._engines.values()]
+            sessions = len(self._sessions)
+        checked_out = 0
+        pooled = 0
+        for engine in engines:
+            pool = engine.pool
+            if hasattr(pool, "checkedout"):
+                checked_out += pool.checkedout()
+            if hasattr(pool, "checkedin"):
+                pooled += pool.checkedin()
+        return {
+            "open_engines": len(engines),
+            "sessions": sessions,
+            "checked_out_connections": checked_out,
+            "idle_connections": pooled,
+            "engines_created": self.created,
+            "engines_evicted": self.evicted,
+        }
+
+
+engine_registry = EngineRegistry()
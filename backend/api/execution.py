@@ -0,0 +1,76 @@
+from django.conf import settings
+from sqlalchemy import text
+
+from .ddl import ddl_tables
+from .metrics import metrics, timed
+from .pagination import clean_page_size, paginate, read_page
+from .result_cache import result_cache
+from .schema_cache import schema_cache
+from .script import execute_script, split_statements
+from .sql_utils import is_read_query
+
+
+def after_write(engine, sql_query):
+    """Drop cached results and re-reflect tables changed by `sql_query`."""
+    result_cache.invalidate(engine, sql_query)
+    is_ddl, tables = ddl_tables(sql_query)
+    if is_ddl and tables is None:
+        schema_cache.invalidate(engine)
+    elif is_ddl:
+        schema_cache.refresh_tables(engine, tables)
+
+
+@timed("query")
+def execute_query(engine, sql_query, page_size=None):
+    """
+    Run generated SQL. SELECTs return their first page; other statements are
+    committed. Returns (rows as dicts, next page token or None, script
+    report or None).
+
+    Scripts of several statements run in one transaction through
+    execute_script; the report has the rowcount of every statement.
+
+    Read results are served from the result cache when RESULT_CACHE_ENABLED;
+    any other statement invalidates the cached results of the tables it
+    touches. DDL re-reflects the tables it changes into the cached schema.
+    """
+    page_size = clean_page_size(page_size)
+    statements = split_statements(sql_query)
+    if len(statements) > 1:
+        data, report = execute_script(engine, statements, page_size)
+        metrics.inc("text2sql_rows_returned_total", len(data))
+        after_write(engine, sql_query)
+        return data, None, report
+
+    if len(statements) == 1:
+        sql_query = statements[0]  # without the BEGIN/COMMIT around it, if any
+
+    read_query = is_read_query(sql_query)
+    use_cache = settings.RESULT_CACHE_ENABLED and read_query
+    if use_cache:
+        cached = result_cache.get(engine, sql_query, page_size)
+        if cached is not None:
+            metrics.inc("text2sql_rows_returned_total", len(cached[0]))
+            return (*cached, None)
+        versions = result_cache.versions(engine, sql_query)
+
+    page_state = paginate(engine, sql_query, schema_cache.get(engine), page_size)
+    if page_state is not None:
+        result = read_page(engine, page_state)
+    else:
+        with engine.connect() as conn:
+            rows = conn.execute(text(sql_query))
+            if read_query:
+                columns = rows.keys()
+                data = [dict(zip(columns, row)) for row in rows]
+            else:
+                conn.commit()  # commit for INSERT/UPDATE/DELETE
+                data = []
+        result = data, None
+
+    metrics.inc("text2sql_rows_returned_total", len(result[0]))
+    if use_cache:
+        result_cache.set(engine, sql_query, page_size, result, versions)
+    elif not read_query:
+        after_write(engine, sql_query)
+    return (*result, None)
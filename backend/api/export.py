@@ -0,0 +1,180 @@
+import csv
+import datetime
+import io
+import json
+import zlib
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .streaming import iter_query_chunks
+
+
+EXPORT_FORMATS = ("csv", "parquet")
+# Compression per format: CSV is gzipped as a whole, Parquet compresses
+# inside the file with the given codec.
+EXPORT_COMPRESSION = {
+    "csv": (None, "gzip"),
+    "parquet": (None, "snappy", "gzip", "zstd"),
+}
+# Dialects whose columns can hold integers and reals side by side.
+DYNAMICALLY_TYPED = {"sqlite"}
+
+
+def load_pyarrow():
+    """pyarrow, imported on first use; None when it is not installed."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:  # Parquet export is optional
+        return None
+    return pyarrow
+
+
+def parquet_available():
+    return load_pyarrow() is not None
+
+
+def csv_chunks(chunks, compression=None):
+    """Encode (columns, rows) chunks as CSV bytes, one piece per chunk."""
+    compressor = zlib.compressobj(wbits=31) if compression == "gzip" else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    for columns, rows in chunks:
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
+
+
+class ChunkSink:
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def arrow_type(pyarrow, values, integers_as_float=False):
+    """
+    Arrow type of a column, from the first non-NULL value of its first
+    chunk. Types are chosen so that later chunks always fit: decimals are
+    written as strings (their precision and scale vary from row to row), and
+    so is anything without an exact Arrow counterpart.
+    """
+    value = next((v for v in values if v is not None), None)
+    if isinstance(value, bool):
+        return pyarrow.bool_()
+    if isinstance(value, int):
+        return pyarrow.float64() if integers_as_float else pyarrow.int64()
+    if isinstance(value, float):
+        return pyarrow.float64()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return pyarrow.binary()
+    if isinstance(value, datetime.datetime):
+        return pyarrow.timestamp("us", tz="UTC" if value.tzinfo else None)
+    if isinstance(value, datetime.date):
+        return pyarrow.date32()
+    if isinstance(value, datetime.time):
+        return pyarrow.time64("us")
+    if isinstance(value, datetime.timedelta):
+        return pyarrow.duration("us")
+    return pyarrow.string()
+
+
+def arrow_values(pyarrow, name, values, type):
+    """`values` converted for a column of Arrow `type`."""
+    if pyarrow.types.is_string(type):
+        return [None if v is None else str(v) for v in values]
+    if pyarrow.types.is_binary(type):
+        return [None if v is None else bytes(v) for v in values]
+    if pyarrow.types.is_integer(type) and not all(
+        v is None or (isinstance(v, int) and not isinstance(v, bool)) for v in values
+    ):
+        # pyarrow would silently truncate 1.5 to 1
+        raise ValueError(f"Column {name!r} mixes integers with other values")
+    return values
+
+
+def parquet_chunks(chunks, compression=None, integers_as_float=False):
+    """
+    Encode (columns, rows) chunks as a Parquet file, one row group per
+    chunk. Column types come from the first chunk (see arrow_type); columns
+    that are all NULL there are written as strings.
+    """
+    pyarrow = load_pyarrow()
+    sink = ChunkSink()
+    writer = None
+    schema = None
+    for columns, rows in chunks:
+        data = {name: [row[i] for row in rows] for i, name in enumerate(columns)}
+        if schema is None:
+            schema = pyarrow.schema([
+                pyarrow.field(name, arrow_type(pyarrow, values, integers_as_float))
+                for name, values in data.items()
+            ])
+            writer = pyarrow.parquet.ParquetWriter(sink, schema, compression=compression or "none")
+        for field in schema:
+            data[field.name] = arrow_values(pyarrow, field.name, data[field.name], field.type)
+        writer.write_table(pyarrow.Table.from_pydict(data, schema=schema))
+        data = sink.drain()
+        if data:
+            yield data
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def export_response(engine, sql_query, fmt="csv", max_rows=None, compression=None, cost_estimate=None):
+    """
+    Stream the result of a read query as a CSV or Parquet download, read
+    from a server-side cursor in EXPORT_CHUNK_SIZE batches and capped at
+    `max_rows` (at most EXPORT_MAX_ROWS) rows. X-Row-Limit reports the cap
+    actually in force, including a LIMIT added by the cost guard, and
+    X-Cost-Estimate the guard's `cost_estimate` as JSON.
+    """
+    if max_rows is not None and max_rows <= 0:
+        raise ValueError("max_rows must be a positive number")
+    max_rows = min(max_rows or settings.EXPORT_MAX_ROWS, settings.EXPORT_MAX_ROWS)
+    chunks = iter_query_chunks(engine, sql_query, max_rows=max_rows, chunk_size=settings.EXPORT_CHUNK_SIZE)
+    if fmt == "parquet":
+        body = parquet_chunks(chunks, compression, engine.dialect.name in DYNAMICALLY_TYPED)
+        content_type = "application/vnd.apache.parquet"
+        filename = "query-result.parquet"
+    else:
+        body = csv_chunks(chunks, compression)
+        content_type = "application/gzip" if compression == "gzip" else "text/csv; charset=utf-8"
+        filename = "query-result.csv.gz" if compression == "gzip" else "query-result.csv"
+    response = StreamingHttpResponse(body, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["X-Accel-Buffering"] = "no"
+    limited_to = (cost_estimate or {}).get("limited_to")
+    response["X-Row-Limit"] = str(min(max_rows, limited_to or max_rows))
+    if cost_estimate is not None:
+        response["X-Cost-Estimate"] = json.dumps(cost_estimate)
+    return response
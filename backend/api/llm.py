@@ -0,0 +1,180 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .metrics import metrics, record_stage
+from .tokens import count_tokens, token_usage
+
+
+LLM_MODEL = "gemini-2.0-flash"
+
+
+class LLMPool:
+    """
+    Per-API-key pool of chat clients shared by all requests in a worker, so
+    the client and its transport are built once instead of on every call.
+    Holds at most LLM_POOL_MAX_CLIENTS clients (least recently used evicted
+    first) and drops clients idle for LLM_POOL_IDLE_TTL seconds.
+    """
+
+    def __init__(self):
+        self._clients = OrderedDict()  # sha256(api_key) -> [client, last_used]
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+
+    def get(self, api_key):
+        key = hashlib.sha256(api_key.encode()).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                entry[1] = now
+                self._clients.move_to_end(key)
+                self.reused += 1
+                return entry[0]
+
+        # Imported on first use: the Gemini/LangChain stack takes about a second
+        # to import, which every worker and manage.py command would otherwise pay.
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        client = ChatGoogleGenerativeAI(model=LLM_MODEL, google_api_key=api_key)
+        with self._lock:
+            entry = self._clients.setdefault(key, [client, now])
+            if entry[0] is client:
+                self.created += 1
+            else:
+                self.reused += 1
+            self._clients.move_to_end(key)
+            while len(self._clients) > settings.LLM_POOL_MAX_CLIENTS:
+                self._clients.popitem(last=False)
+                self.evicted += 1
+            return entry[0]
+
+    def _expire(self, now):
+        while self._clients:
+            key, (client, last_used) = next(iter(self._clients.items()))
+            if now - last_used <= settings.LLM_POOL_IDLE_TTL:
+                break
+            del self._clients[key]
+            self.evicted += 1
+
+    def stats(self):
+        with self._lock:
+            calls = self.created + self.reused
+            return {
+                "clients": len(self._clients),
+                "created": self.created,
+                "reused": self.reused,
+                "evicted": self.evicted,
+                "reuse_ratio": round(self.reused / calls, 4) if calls else 0.0,
+            }
+
+
+llm_pool = LLMPool()
+
+
+def get_llm(api_key):
+    return llm_pool.get(api_key)
+
+
+class RateLimiter:
+    """
+    Token bucket per API key: LLM_RATE_LIMIT_PER_MINUTE calls a minute with
+    bursts of up to LLM_RATE_LIMIT_BURST. acquire() blocks until a call is
+    allowed. A limit of 0 disables it.
+    """
+
+    def __init__(self):
+        self._buckets = {}  # sha256(api_key) -> [tokens, updated_at]
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self, api_key):
+        """Wait for a call slot for `api_key`; returns the seconds waited."""
+        rate = settings.LLM_RATE_LIMIT_PER_MINUTE / 60
+        if rate <= 0:
+            return 0.0
+        burst = max(settings.LLM_RATE_LIMIT_BURST, 1)
+        key = hashlib.sha256(api_key.encode()).hexdigest()
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, updated_at = self._buckets.get(key, (burst, now))
+                tokens = min(burst, tokens + (now - updated_at) * rate)
+                if tokens >= 1:
+                    self._buckets[key] = (tokens - 1, now)
+                    self.waited += waited
+                    return waited
+                self._buckets[key] = (tokens, now)
+                delay = (1 - tokens) / rate
+            time.sleep(delay)
+            waited += delay
+
+
+llm_rate_limiter = RateLimiter()
+
+
+def call_usage(prompt, text, usage_metadata, started):
+    """Token counts of one call, preferring what the provider reported."""
+    usage_metadata = usage_metadata or {}
+    return {
+        "input_tokens": usage_metadata.get("input_tokens") or count_tokens(prompt),
+        "output_tokens": usage_metadata.get("output_tokens") or count_tokens(text),
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def record_usage(stage, usage):
+    token_usage.record(stage, usage["input_tokens"], usage["output_tokens"], usage["latency_ms"])
+    record_stage(f"llm_{stage}", usage["latency_ms"])
+    metrics.inc("text2sql_llm_calls_total", stage=stage)
+    metrics.inc("text2sql_llm_tokens_total", usage["input_tokens"], stage=stage, direction="input")
+    metrics.inc("text2sql_llm_tokens_total", usage["output_tokens"], stage=stage, direction="output")
+
+
+def invoke_llm(api_key, stage, prompt, rate_limited=False):
+    """
+    Run one LLM call and record its token usage. Returns (text, usage).
+    With `rate_limited`, waits for the per-key rate limiter first.
+    """
+    if rate_limited:
+        llm_rate_limiter.acquire(api_key)
+    started = time.perf_counter()
+    response = get_llm(api_key).invoke(prompt)
+    usage = call_usage(prompt, response.content, response.usage_metadata, started)
+    record_usage(stage, usage)
+    return response.content, usage
+
+
+async def ainvoke_llm(api_key, stage, prompt):
+    """Async invoke_llm."""
+    started = time.perf_counter()
+    # The first client of a key imports LangChain and builds its transport,
+    # which would block the event loop for about a second
+    llm = await sync_to_async(get_llm, thread_sensitive=False)(api_key)
+    response = await llm.ainvoke(prompt)
+    usage = call_usage(prompt, response.content, response.usage_metadata, started)
+    record_usage(stage, usage)
+    return response.content, usage
+
+
+def stream_llm(api_key, stage, prompt):
+    """Yield text chunks of a streamed LLM call; usage is recorded at the end."""
+    started = time.perf_counter()
+    parts = []
+    usage_metadata = None
+    for chunk in get_llm(api_key).stream(prompt):
+        if chunk.usage_metadata:
+            usage_metadata = chunk.usage_metadata
+        if chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+    record_usage(stage, call_usage(prompt, "".join(parts), usage_metadata, started))
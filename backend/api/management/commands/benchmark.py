@@ -0,0 +1,280 @@
+import asyncio
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from langchain_core.messages import AIMessage, AIMessageChunk
+from sqlalchemy import Column, Float, ForeignKey, Integer, MetaData, String, Table, create_engine
+
+from api import llm
+
+
+STAGES = ("connect-db", "get-tables", "ask-db", "execute-db")
+TABLE_RE = re.compile(r"bench_t\d+")
+
+
+class StubLLM:
+    """
+    Deterministic stand-in for the Gemini client. SQL prompts are answered
+    with a SELECT on the bench table named in the question; every other
+    prompt gets a fixed explanation. Each call sleeps `latency` seconds.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def reply(self, prompt):
+        if "User Question:" in prompt:
+            match = TABLE_RE.search(prompt.rsplit("User Question:", 1)[1])
+            table = match.group(0) if match else "bench_t0"
+            return f"```sql\nSELECT * FROM {table};\n```"
+        return "For your data, the benchmark query returned the expected rows."
+
+    def invoke(self, prompt):
+        time.sleep(self.latency)
+        return AIMessage(content=self.reply(prompt))
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.latency)
+        return AIMessage(content=self.reply(prompt))
+
+    def stream(self, prompt):
+        time.sleep(self.latency)
+        yield AIMessageChunk(content=self.reply(prompt))
+
+
+def build_fixture(engine, tables, columns, rows, seed=0):
+    """
+    Create `tables` tables bench_t0..bench_tN, each with an integer key, a
+    foreign key to the previous table and `columns` numeric/text columns,
+    and fill each with `rows` deterministic rows.
+    """
+    metadata = MetaData()
+    for i in range(tables):
+        table_columns = [Column("id", Integer, primary_key=True)]
+        if i:
+            table_columns.append(Column(f"bench_t{i - 1}_id", Integer, ForeignKey(f"bench_t{i - 1}.id")))
+        for j in range(columns):
+            kind = (Integer, Float, String(32))[j % 3]
+            table_columns.append(Column(f"c{j}", kind))
+        Table(f"bench_t{i}", metadata, *table_columns)
+
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    rng = random.Random(seed)
+    with engine.begin() as conn:
+        for i, table in enumerate(metadata.sorted_tables):
+            batch = []
+            for row_id in range(1, rows + 1):
+                row = {"id": row_id}
+                if i:
+                    row[f"bench_t{i - 1}_id"] = rng.randint(1, rows)
+                for j in range(columns):
+                    row[f"c{j}"] = (rng.randint(0, 10000), rng.random() * 1000, f"value-{rng.randint(0, 99)}")[j % 3]
+                batch.append(row)
+                if len(batch) == 1000:
+                    conn.execute(table.insert(), batch)
+                    batch = []
+            if batch:
+                conn.execute(table.insert(), batch)
+    return metadata
+
+
+def summarize(latencies, errors, wall):
+    latencies = np.asarray(latencies, dtype=np.float64)
+    p50, p95, p99 = np.percentile(latencies, (50, 95, 99)) if len(latencies) else (0.0, 0.0, 0.0)
+    return {
+        "requests": int(len(latencies)),
+        "errors": errors,
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "mean_ms": round(float(latencies.mean()), 2) if len(latencies) else 0.0,
+        "max_ms": round(float(latencies.max()), 2) if len(latencies) else 0.0,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark connect-db, get-tables, ask-db and execute-db against a generated "
+        "fixture database with a stub LLM, and report p50/p95/p99 latency and throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--db-url", help="SQLAlchemy URL of a scratch database (default: temporary SQLite file). Its bench_t* tables are replaced.")
+        parser.add_argument("--tables", type=int, default=10)
+        parser.add_argument("--columns", type=int, default=8)
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--iterations", type=int, default=50, help="Measured requests per stage.")
+        parser.add_argument("--warmup", type=int, default=3, help="Unmeasured requests per stage.")
+        parser.add_argument("--concurrency", type=int, default=1, help="Concurrent clients per stage.")
+        parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+        parser.add_argument("--warm-cache", action="store_true", help="Let the SQL and result caches serve repeated requests.")
+        parser.add_argument("--keep", action="store_true", help="Keep the fixture tables afterwards.")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+        parser.add_argument("--output", help="Also write the JSON report to this file.")
+        parser.add_argument("--baseline", help="JSON report to compare against; fails when a stage's p95 regresses.")
+        parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 regression against --baseline (0.2 = 20%%).")
+
+    def handle(self, *args, **options):
+        if options["tables"] < 1 or options["iterations"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--tables, --iterations and --concurrency must be at least 1")
+
+        fixture_path = None
+        db_url = options["db_url"]
+        if not db_url:
+            fd, fixture_path = tempfile.mkstemp(prefix="text2sql-bench-", suffix=".sqlite3")
+            os.close(fd)
+            db_url = f"sqlite:///{fixture_path}"
+
+        fixture_engine = create_engine(db_url)
+        started = time.perf_counter()
+        metadata = build_fixture(fixture_engine, options["tables"], options["columns"], options["rows"])
+        if not options["json"]:
+            self.stdout.write(
+                f"Fixture: {options['tables']} tables x {options['columns']} columns x "
+                f"{options['rows']} rows in {time.perf_counter() - started:.1f}s"
+            )
+
+        stub = StubLLM(options["llm_latency_ms"] / 1000)
+        overrides = {
+            "SESSION_ENGINE": "django.contrib.sessions.backends.cache",
+            "SESSION_COOKIE_SECURE": False,
+            "SQL_CACHE_PERSISTENT": False,
+            "LLM_RATE_LIMIT_PER_MINUTE": 0,
+        }
+        if not options["warm_cache"]:
+            overrides["RESULT_CACHE_ENABLED"] = False
+        try:
+            with override_settings(**overrides), mock.patch.object(llm, "get_llm", lambda api_key: stub):
+                report = self.run_stages(db_url, options)
+        finally:
+            if not options["keep"]:
+                metadata.drop_all(fixture_engine)
+            fixture_engine.dispose()
+            if fixture_path and not options["keep"]:
+                os.remove(fixture_path)
+
+        report = {
+            "config": {
+                key: options[key] for key in
+                ("tables", "columns", "rows", "iterations", "concurrency", "llm_latency_ms", "warm_cache")
+            },
+            "stages": report,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report["stages"])
+        if options["baseline"]:
+            self.check_baseline(report["stages"], options["baseline"], options["tolerance"])
+
+    def run_stages(self, db_url, options):
+        clients = [Client() for _ in range(options["concurrency"])]
+        tables = options["tables"]
+        bypass_cache = not options["warm_cache"]
+
+        def connect(client, i):
+            return client.post("/connect-db/", {"connection_string": db_url}, content_type="application/json")
+
+        def get_tables(client, i):
+            return client.get("/get-tables/")
+
+        def ask(client, i):
+            return client.post(
+                "/ask-db/",
+                {"question": f"Show every row of bench_t{i % tables}", "bypass_cache": bypass_cache},
+                content_type="application/json",
+            )
+
+        def prime(client, i):
+            session = client.session
+            session["last_query"] = f"SELECT * FROM bench_t{i % tables};"
+            session["last_question"] = f"Show every row of bench_t{i % tables}"
+            session.save()
+
+        def execute(client, i):
+            return client.post("/execute-db/", {}, content_type="application/json")
+
+        for client in clients:
+            connect(client, 0)
+            session = client.session
+            session["api_key"] = "benchmark"
+            session.save()
+
+        return {
+            "connect-db": self.run_stage(clients, connect, options),
+            "get-tables": self.run_stage(clients, get_tables, options),
+            "ask-db": self.run_stage(clients, ask, options),
+            "execute-db": self.run_stage(clients, execute, options, prepare=prime),
+        }
+
+    def run_stage(self, clients, request, options, prepare=None):
+        """Send `iterations` requests spread over the clients; returns the summary."""
+        iterations = options["iterations"]
+        for i in range(options["warmup"]):
+            if prepare:
+                prepare(clients[0], i)
+            request(clients[0], i)
+
+        def worker(index):
+            client = clients[index]
+            latencies = []
+            errors = 0
+            for i in range(index, iterations, len(clients)):
+                if prepare:
+                    prepare(client, i)
+                started = time.perf_counter()
+                response = request(client, i)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+            return latencies, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+            results = list(pool.map(worker, range(len(clients))))
+        wall = time.perf_counter() - started
+        latencies = [latency for worker_latencies, _ in results for latency in worker_latencies]
+        return summarize(latencies, sum(errors for _, errors in results), wall)
+
+    def print_report(self, stages):
+        header = f"{'stage':<12}{'reqs':>6}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'req/s':>10}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for name in STAGES:
+            s = stages[name]
+            self.stdout.write(
+                f"{name:<12}{s['requests']:>6}{s['errors']:>6}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}"
+                f"{s['p99_ms']:>10.2f}{s['mean_ms']:>10.2f}{s['throughput_rps']:>10.2f}"
+            )
+
+    def check_baseline(self, stages, path, tolerance):
+        with open(path) as f:
+            baseline = json.load(f)["stages"]
+        regressions = []
+        for name in STAGES:
+            if name not in baseline or not baseline[name]["p95_ms"]:
+                continue
+            allowed = baseline[name]["p95_ms"] * (1 + tolerance)
+            if stages[name]["p95_ms"] > allowed:
+                regressions.append(
+                    f"{name}: p95 {stages[name]['p95_ms']:.2f} ms > {allowed:.2f} ms "
+                    f"(baseline {baseline[name]['p95_ms']:.2f} ms)"
+                )
+        if regressions:
+            raise CommandError("Performance regression:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No p95 regression against baseline."))
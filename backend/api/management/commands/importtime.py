@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Runs in a fresh interpreter, since everything is already imported here.
+STARTUP_CODE = """
+import importlib, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.conf import settings
+importlib.import_module(settings.ROOT_URLCONF)
+{preload}
+print(time.perf_counter() - started)
+"""
+
+
+def parse_importtime(output):
+    """Parse `python -X importtime` output into (module, depth, self_us, cumulative_us)."""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header line
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), depth, int(parts[0]), int(parts[1])))
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how long a fresh worker takes to load Django and the URLconf, "
+        "and report import time per module."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=25, help="Number of modules to list.")
+        parser.add_argument("--preload", action="store_true", help="Also run the preload hook (api.preload).")
+        parser.add_argument("--by-package", action="store_true", help="Sum self time per top-level package instead.")
+
+    def handle(self, *args, **options):
+        preload = "from api.preload import preload; preload()" if options["preload"] else ""
+        env = dict(os.environ, PRELOAD_HEAVY_MODULES="0")
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_CODE.format(preload=preload)],
+            capture_output=True, text=True, env=env, cwd=os.getcwd(),
+        )
+        if process.returncode != 0:
+            raise CommandError(f"Startup failed:\n{process.stderr[-2000:]}")
+
+        modules = parse_importtime(process.stderr)
+        total = float(process.stdout.strip().splitlines()[-1])
+        self.stdout.write(f"Startup (django.setup + URLconf{' + preload' if preload else ''}): {total * 1000:.0f} ms, "
+                          f"{len(modules)} modules imported")
+
+        if options["by_package"]:
+            packages = defaultdict(int)
+            for name, depth, self_us, cumulative_us in modules:
+                packages[name.split(".")[0]] += self_us
+            rows = sorted(packages.items(), key=lambda item: -item[1])[:options["top"]]
+            self.stdout.write(f"{'self ms':>10}  package")
+            for package, self_us in rows:
+                self.stdout.write(f"{self_us / 1000:>10.1f}  {package}")
+            return
+
+        rows = sorted(modules, key=lambda module: -module[3])[:options["top"]]
+        self.stdout.write(f"{'cumul ms':>10}{'self ms':>10}  module")
+        for name, depth, self_us, cumulative_us in rows:
+            self.stdout.write(f"{cumulative_us / 1000:>10.1f}{self_us / 1000:>10.1f}  {'  ' * depth}{name}")
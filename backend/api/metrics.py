@@ -0,0 +1,109 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRICS = {
+    "text2sql_http_requests_total": ("counter", "HTTP requests by view and status code."),
+    "text2sql_http_request_duration_seconds": ("histogram", "HTTP request latency by view."),
+    "text2sql_stage_duration_seconds": ("histogram", "Latency of request stages (schema, prompt, llm_*, query, ...)."),
+    "text2sql_llm_calls_total": ("counter", "LLM calls by stage."),
+    "text2sql_llm_tokens_total": ("counter", "LLM tokens by stage and direction (input/output)."),
+    "text2sql_rows_returned_total": ("counter", "Rows returned by executed queries."),
+    "text2sql_cache_requests_total": ("counter", "Cache lookups by cache and result (hit/miss)."),
+}
+
+# Stage durations (ms) of the request being handled, set by the middleware.
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    """
+    Per-process counters and histograms, rendered in the Prometheus text
+    exposition format. Each worker process keeps its own values.
+    """
+
+    def __init__(self):
+        self._counters = {}    # name -> {labels: value}
+        self._histograms = {}  # name -> {labels: [bucket counts, sum, count]}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in METRICS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "counter":
+                    for labels, value in sorted(self._counters.get(name, {}).items()):
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+                    continue
+                for labels, (buckets, total, count) in sorted(self._histograms.get(name, {}).items()):
+                    for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+                        lines.append(f"{name}_bucket{format_labels(labels, ('le', bound))} {bucket_count}")
+                    lines.append(f"{name}_bucket{format_labels(labels, ('le', '+Inf'))} {count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {total:.6f}")
+                    lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def record_stage(stage, ms):
+    """Add `ms` to the current request's Server-Timing and the stage histogram."""
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + ms
+    metrics.observe("text2sql_stage_duration_seconds", ms / 1000, stage=stage)
+
+
+@contextmanager
+def timed(stage):
+    """Time the enclosed block (or decorated function) as `stage`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, (time.perf_counter() - started) * 1000)
+
+
+def server_timing(timings, total_ms):
+    """Server-Timing header value for the stage durations of one request."""
+    entries = [f"{stage};dur={ms:.1f}" for stage, ms in timings.items()]
+    entries.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(entries)
@@ -0,0 +1,52 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import metrics, request_timings, server_timing
+
+
+class ServerTimingMiddleware:
+    """
+    Collects the stage timings recorded while a request is handled, sends
+    them as a Server-Timing header and feeds the per-view request metrics.
+    Works for both sync and async views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = {}
+        token = request_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_timings.reset(token)
+        return self.finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        timings = {}
+        token = request_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_timings.reset(token)
+        return self.finish(request, response, timings, started)
+
+    def finish(self, request, response, timings, started):
+        elapsed = time.perf_counter() - started
+        match = getattr(request, "resolver_match", None)
+        view = match.url_name if match and match.url_name else "unmatched"
+        response["Server-Timing"] = server_timing(timings, elapsed * 1000)
+        metrics.inc("text2sql_http_requests_total", view=view, status=response.status_code)
+        metrics.observe("text2sql_http_request_duration_seconds", elapsed, view=view)
+        return response
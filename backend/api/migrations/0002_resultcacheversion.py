@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 05:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultCacheVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('connection', models.CharField(max_length=64)),
+                ('table', models.CharField(max_length=255)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('connection', 'table'), name='result_cache_version_unique')],
+            },
+        ),
+    ]
@@ -1,3 +1,36 @@
 from django.db import models
 
 # Create your models here.
+
+
+class GeneratedQuery(models.Model):
+    """Persistent tier of the question-to-SQL cache (see api/sql_cache.py)."""
+
+    key = models.CharField(max_length=64, unique=True)
+    question = models.TextField()
+    sql = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    hits = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.question
+
+
+class ResultCacheVersion(models.Model):
+    """
+    Write counter of one table of one connection, shared by all workers so a
+    write on one invalidates the cached results of the others (see
+    api/result_cache.py).
+    """
+
+    connection = models.CharField(max_length=64)
+    table = models.CharField(max_length=255)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["connection", "table"], name="result_cache_version_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.table}@{self.version}"
@@ -0,0 +1,209 @@
+import sqlparse
+from django.conf import settings
+from django.core import signing
+from sqlalchemy import text
+from sqlparse import tokens as T
+from sqlparse.sql import Identifier, IdentifierList
+
+from .sql_utils import strip_statement
+
+
+TOKEN_SALT = "api.pagination"
+
+# Top-level keywords that make the query's own row order or row set matter,
+# so pages must be cut with OFFSET instead of a primary-key keyset.
+KEYSET_BLOCKERS = {
+    "ORDER BY", "GROUP BY", "HAVING", "DISTINCT", "LIMIT", "OFFSET", "FETCH",
+    "UNION", "UNION ALL", "INTERSECT", "EXCEPT",
+}
+KEYSET_VALUE_TYPES = (int, float, str)
+
+
+def parse_select(sql_query):
+    """Return the parsed statement if `sql_query` is one plain SELECT, else None."""
+    statements = [s for s in sqlparse.parse(sql_query) if s.token_first(skip_cm=True)]
+    if len(statements) != 1 or statements[0].get_type() != "SELECT":
+        return None
+    return statements[0]
+
+
+def top_level_keywords(statement):
+    return {
+        token.normalized for token in statement.tokens
+        if token.ttype in T.Keyword
+    }
+
+
+def has_top_level_limit(statement):
+    return bool(top_level_keywords(statement) & {"LIMIT", "FETCH"})
+
+
+def has_top_level_offset(statement):
+    return "OFFSET" in top_level_keywords(statement)
+
+
+def select_columns(statement):
+    """Output column names of the select list, or None for `*`."""
+    columns = []
+    for token in statement.tokens:
+        if token.ttype in T.Keyword and token.normalized == "FROM":
+            break
+        items = []
+        if isinstance(token, IdentifierList):
+            items = list(token.get_identifiers())
+        elif isinstance(token, Identifier) or token.ttype is T.Wildcard:
+            items = [token]
+        for item in items:
+            if item.ttype is T.Wildcard or (isinstance(item, Identifier) and item.is_wildcard()):
+                return None
+            columns.append(item.get_name())
+    return columns
+
+
+def from_table(statement):
+    """Name of the single table in FROM, or None for joins and subqueries."""
+    seen_from = False
+    table = None
+    for token in statement.tokens:
+        if token.is_whitespace:
+            continue
+        if token.ttype in T.Keyword and token.normalized == "FROM":
+            seen_from = True
+            continue
+        if not seen_from:
+            continue
+        if token.ttype in T.Keyword and "JOIN" in token.normalized:
+            return None
+        if table is None:
+            if not isinstance(token, Identifier) or token.token_first().is_group:
+                return None
+            table = token.get_real_name()
+    return table
+
+
+def keyset_columns(statement, schema_entry):
+    """
+    Primary-key columns usable as a keyset for `statement`, or None.
+
+    A keyset needs a single-table SELECT without its own ordering, grouping,
+    limit or set operation, whose output includes the table's primary key.
+    """
+    if top_level_keywords(statement) & KEYSET_BLOCKERS:
+        return None
+    table = from_table(statement)
+    meta = schema_entry.table_meta.get(table) if table else None
+    if not meta or not meta["primary_key"]:
+        return None
+    columns = select_columns(statement)
+    if columns is not None and not set(meta["primary_key"]) <= set(columns):
+        return None
+    return meta["primary_key"]
+
+
+def build_page_query(engine, state):
+    """SQL text and bind parameters that fetch one page (+1 row) for `state`."""
+    sql_query = state["sql"]
+    limit = state["page_size"] + 1
+    if state.get("keys"):
+        quote = engine.dialect.identifier_preparer.quote
+        keys = [quote(column) for column in state["keys"]]
+        if state.get("by_offset"):
+            # Same order as the keyset pages before it, cut with OFFSET
+            return (
+                f"SELECT * FROM ({sql_query}) AS _page ORDER BY {', '.join(keys)} "
+                f"LIMIT :_limit OFFSET :_offset",
+                {"_limit": limit, "_offset": state.get("offset", 0)},
+            )
+        params = {"_limit": limit}
+        where = ""
+        if state.get("after") is not None:
+            names = [f":_k{i}" for i in range(len(keys))]
+            params.update({f"_k{i}": value for i, value in enumerate(state["after"])})
+            if len(keys) == 1:
+                where = f" WHERE {keys[0]} > {names[0]}"
+            else:
+                where = f" WHERE ({', '.join(keys)}) > ({', '.join(names)})"
+        query = (
+            f"SELECT * FROM ({sql_query}) AS _page{where} "
+            f"ORDER BY {', '.join(keys)} LIMIT :_limit"
+        )
+        return query, params
+
+    params = {"_limit": limit, "_offset": state.get("offset", 0)}
+    if state.get("wrap"):
+        return f"SELECT * FROM ({sql_query}) AS _page LIMIT :_limit OFFSET :_offset", params
+    return f"{sql_query} LIMIT :_limit OFFSET :_offset", params
+
+
+def read_page(engine, state):
+    """
+    Run one page of a paginated query.
+    Returns (rows as dicts, next page token or None).
+    """
+    query, params = build_page_query(engine, state)
+    with engine.connect() as conn:
+        result = conn.execute(text(query), params)
+        columns = list(result.keys())
+        rows = result.fetchmany(state["page_size"] + 1)
+
+    has_more = len(rows) > state["page_size"]
+    rows = rows[:state["page_size"]]
+    data = [dict(zip(columns, row)) for row in rows]
+    if not has_more:
+        return data, None
+
+    next_state = dict(state)
+    if state.get("keys"):
+        after = [data[-1][column] for column in state["keys"]]
+        if not state.get("by_offset") and all(isinstance(value, KEYSET_VALUE_TYPES) for value in after):
+            next_state["after"] = after
+        else:
+            # Key values that do not survive a JSON round trip (Decimal, date,
+            # UUID, ...): keep the key order but cut pages with OFFSET from here on.
+            next_state.update(by_offset=True, after=None)
+    next_state["offset"] = state.get("offset", 0) + len(data)
+    return data, encode_page_token(next_state)
+
+
+def clean_page_size(page_size):
+    """
+    `page_size` from a request as an int between 1 and EXECUTE_MAX_PAGE_SIZE;
+    EXECUTE_PAGE_SIZE when it is missing or not a number.
+    """
+    try:
+        page_size = int(page_size)
+    except (TypeError, ValueError):
+        return settings.EXECUTE_PAGE_SIZE
+    return min(max(page_size, 1), settings.EXECUTE_MAX_PAGE_SIZE)
+
+
+def paginate(engine, sql_query, schema_entry, page_size=None):
+    """
+    Page state for a SELECT, or None when the query cannot be paginated.
+    Queries without their own LIMIT or OFFSET get one injected per page, the
+    others are wrapped in a subquery; comments are stripped first so a
+    trailing `-- ...` can't swallow the LIMIT.
+    """
+    statement = parse_select(sql_query)
+    if statement is None:
+        return None
+    return {
+        "sql": strip_statement(sqlparse.format(sql_query, strip_comments=True)),
+        "page_size": clean_page_size(page_size),
+        "keys": keyset_columns(statement, schema_entry),
+        "wrap": has_top_level_limit(statement) or has_top_level_offset(statement),
+        "offset": 0,
+        "after": None,
+    }
+
+
+def encode_page_token(state):
+    """Opaque, signed continuation token (the client cannot alter the SQL)."""
+    return signing.dumps(state, salt=TOKEN_SALT, compress=True)
+
+
+def decode_page_token(token):
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=settings.EXECUTE_PAGE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        raise ValueError("Invalid or expired page token")
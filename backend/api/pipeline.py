@@ -0,0 +1,123 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .cost_guard import QueryCostExceeded, guard_query
+from .llm import invoke_llm
+from .prompts import assemble_sql_prompt, build_answer_prompt, clean_sql
+from .result_digest import build_digest
+from .sql_cache import cache_key as sql_cache_key, sql_cache
+from .sql_utils import is_read_query
+from .streaming import iter_query_chunks, sse_event
+
+
+# Explanations run here while the request thread keeps streaming rows.
+explain_executor = ThreadPoolExecutor(
+    max_workers=settings.PIPELINE_EXPLAIN_THREADS, thread_name_prefix="text2sql-explain"
+)
+
+
+def generate_sql(api_key, schema_entry, question, bypass_cache=False, rate_limited=False):
+    """
+    SQL for `question`, from the generated-SQL cache or the LLM.
+    Returns (sql, selected tables, cached, token usage or None when cached).
+    """
+    prompt, tables, _ = assemble_sql_prompt(schema_entry, question)
+    key = sql_cache_key(question, schema_entry)
+    sql_query = None if bypass_cache else sql_cache.get(key)
+    if sql_query is not None:
+        return sql_query, tables, True, None
+
+    text, usage = invoke_llm(api_key, "generate_sql", prompt, rate_limited)
+    sql_query = clean_sql(text)
+    if sql_query:
+        sql_cache.set(key, question, sql_query)
+    return sql_query, tables, False, usage
+
+
+def explain(api_key, question, sql_query, digest):
+    text, usage = invoke_llm(api_key, "explain", build_answer_prompt(question, sql_query, digest))
+    return text.strip()
+
+
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def run_pipeline(engine, api_key, schema_entry, question, bypass_cache=False, confirmed=False):
+    """
+    Generate, execute and explain a read-only question as one SSE stream.
+
+    The explanation is started from the digest of the first chunk of rows and
+    runs concurrently with streaming the rest, so the total time is about
+    generate + max(execute, explain) instead of their sum.
+
+    events: sql {"query", "selected_tables", "cached"}, columns {"columns"},
+            rows {"rows"} ..., answer {"nl_answer"},
+            done {"row_count", "truncated", "cost_estimate", "timings"} or
+            error {"message"} ("cost_estimate" and "confirm_required" too when
+            the cost guard stopped the query)
+    """
+    timings = {}
+    started = time.perf_counter()
+    try:
+        stage = time.perf_counter()
+        sql_query, tables, cached, usage = generate_sql(api_key, schema_entry, question, bypass_cache)
+        timings["generate_sql_ms"] = elapsed_ms(stage)
+        yield sse_event("sql", {"query": sql_query, "selected_tables": tables, "cached": cached})
+
+        if not sql_query or not is_read_query(sql_query):
+            yield sse_event("error", {
+                "message": "Only read-only queries can be run by this endpoint. Use execute-db instead."
+            })
+            return
+
+        stage = time.perf_counter()
+        try:
+            sql_query, cost_estimate = guard_query(engine, sql_query, confirmed)
+        except QueryCostExceeded as e:
+            yield sse_event("error", {
+                "message": str(e),
+                "cost_estimate": e.estimate,
+                "confirm_required": e.confirmable,
+            })
+            return
+        timings["cost_guard_ms"] = elapsed_ms(stage)
+
+        max_rows = settings.EXECUTE_STREAM_MAX_ROWS
+        chunk_size = settings.EXECUTE_STREAM_CHUNK_SIZE
+        explanation = None
+        row_count = 0
+        stage = time.perf_counter()
+        for columns, rows in iter_query_chunks(engine, sql_query, max_rows=max_rows, chunk_size=chunk_size):
+            if explanation is None:
+                timings["first_rows_ms"] = elapsed_ms(stage)
+                yield sse_event("columns", {"columns": columns})
+                digest = build_digest(
+                    [dict(zip(columns, row)) for row in rows],
+                    more_rows=len(rows) >= chunk_size,
+                )
+                explain_started = time.perf_counter()
+                explanation = explain_executor.submit(explain, api_key, question, sql_query, digest)
+            row_count += len(rows)
+            if rows:
+                yield sse_event("rows", {"rows": rows})
+        timings["execute_ms"] = elapsed_ms(stage)
+
+        if explanation is None:
+            explain_started = time.perf_counter()
+            explanation = explain_executor.submit(explain, api_key, question, sql_query, build_digest([]))
+        nl_answer = explanation.result()
+        timings["explain_ms"] = elapsed_ms(explain_started)
+        yield sse_event("answer", {"nl_answer": nl_answer})
+
+        timings["total_ms"] = elapsed_ms(started)
+        yield sse_event("done", {
+            "row_count": row_count,
+            "truncated": row_count >= min(max_rows, (cost_estimate or {}).get("limited_to") or max_rows),
+            "cost_estimate": cost_estimate,
+            "timings": timings,
+        })
+    except Exception as e:
+        yield sse_event("error", {"message": f"Failed to run pipeline: {str(e)}"})
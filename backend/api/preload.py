@@ -0,0 +1,35 @@
+import importlib
+import time
+
+from .tokens import get_encoding
+
+
+# Modules the app imports on first use rather than at startup.
+HEAVY_MODULES = (
+    "langchain_google_genai",
+    "numpy",
+    "tenacity",
+    "tiktoken",
+    "pyarrow.parquet",
+)
+
+
+def preload(modules=HEAVY_MODULES):
+    """
+    Import the lazily loaded modules and the tiktoken encoding up front, so a
+    prefork server (gunicorn --preload) pays for them once in the master
+    instead of on the first request of every worker. Modules that are not
+    installed are skipped. Returns {module: seconds}.
+    """
+    timings = {}
+    for name in modules:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+        timings[name] = time.perf_counter() - started
+    started = time.perf_counter()
+    get_encoding()
+    timings["tiktoken encoding"] = time.perf_counter() - started
+    return timings
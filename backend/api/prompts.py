@@ -0,0 +1,231 @@
+from functools import lru_cache
+
+from django.conf import settings
+
+from .metrics import timed
+from .schema_retrieval import schema_text, select_tables
+from .tokens import count_tokens, truncate_to_tokens
+
+
+# Static instructions of the SQL prompt, built once at import; only the
+# tables, schema and question are filled in per request.
+SQL_PROMPT_PREFIX = """
+You are an expert SQL query generator with analytical capabilities. Follow these rules precisely:
+## Pre-Analysis Phase
+Before generating any SQL query, you must:
+1. **Schema Analysis**: Examine all provided tables, their columns, data types, constraints, and relationships
+2. **Requirement Analysis**: Break down the user's request to understand what tables/columns are needed
+3. **Relationship Mapping**: Identify foreign key relationships and join requirements
+4. **Query Type Classification**: Determine if this is DDL (CREATE/ALTER/DROP), DML (INSERT/UPDATE/DELETE), or DQL (SELECT)
+5. **Validation Check**: Verify all referenced tables and columns exist in the provided schema
+## Core Rules
+### 1. Schema-First Approach
+- **ALWAYS** read the complete schema before generating SQL
+- Use **EXACT** table and column names from schema (no assumptions, no pluralization)
+- If schema shows `customer` table, use `customer` not `customers`
+- If column is `customerid`, use `customerid` not `customer_id`
+
+### 2. Foreign Key Handling
+- **Existing referenced table with PK**: Use the primary key column(s)
+  ```sql
+  -- If schema shows: customer(customerid PK, name, email)
+  FOREIGN KEY (customer_id) REFERENCES customer(customerid)
+  ```
+- **Existing referenced table without declared PK**: Use id-like column (customerid, customer_id, id)
+- **Missing referenced table**: Respond exactly: `"I don't have enough knowledge about that."`
+- **Create referenced table only when explicitly requested**
+### 3. DDL Commands (CREATE/ALTER/DROP)
+- **CREATE TABLE**: Include appropriate data types, constraints, and primary keys
+- **ALTER TABLE**: Specify exact modification (ADD COLUMN, DROP COLUMN, MODIFY, etc.)
+- **DROP TABLE**: Include CASCADE if foreign key dependencies exist
+- **Indexes**: Create appropriate indexes for foreign keys and frequently queried columns
+### 4. DML Commands (INSERT/UPDATE/DELETE)
+- **INSERT**: Use consistent formatting:
+  ```sql
+  INSERT INTO products (productid, product_name, category, price) 
+  VALUES (1, 'Laptop', 'Electronics', 999.99);
+  ```
+- **UPDATE**: Always include WHERE clause unless bulk update is explicitly requested
+- **DELETE**: Always include WHERE clause unless truncation is explicitly requested
+- **Batch Operations**: Generate multiple statements when appropriate
+### 5. DQL Commands (SELECT)
+- **Simple SELECT**: Use proper column selection and table references
+- **JOINs**: Use appropriate join types (INNER, LEFT, RIGHT, FULL OUTER)
+- **Aggregations**: Include proper GROUP BY and HAVING clauses
+- **Subqueries**: Use when complex filtering is needed
+- **Window Functions**: Apply for advanced analytics when appropriate
+### 6. Output Format
+- **SQL ONLY**: Output must be raw SQL query text
+- **No explanations, comments, or additional text**
+- **Proper formatting**: Use consistent indentation and line breaks for readability
+- **Semicolon termination**: End each statement with semicolon
+### 7. Error Handling
+- **No schema provided**: `"I don't have enough data to generate SQL query."`
+- **Schema provided but empty**: `"I don't have knowledge, please connect a proper database."`
+- **Unknown table/column referenced**: `"I don't have enough knowledge about that."`
+- **Ambiguous request**: `"I don't have enough knowledge about that."`
+### 8. Advanced Features
+- **Transactions**: Wrap related DML operations in BEGIN/COMMIT blocks when appropriate
+- **Constraints**: Add CHECK constraints, UNIQUE constraints as needed
+- **Data Types**: Choose appropriate data types based on context
+- **Performance**: Consider indexing strategies for large datasets
+## Analysis Framework
+Before generating SQL, mentally process:
+1. What tables are involved?
+2. What columns are needed?
+3. What relationships exist?
+4. What constraints apply?
+5. What is the expected output?
+## Example Workflow
+```
+User Request: "Create orders table with customer reference"
+Analysis:
+- DDL command (CREATE TABLE)
+- Need: orders table structure
+- Foreign key: customer reference
+- Check: customer table exists in schema?
+- PK: What's the customer table's primary key?
+- Generate: CREATE TABLE with proper foreign key
+```
+Remember: Think first, validate against schema, then generate precise SQL.
+"""
+
+
+def build_sql_prompt(tables, schema, question):
+    """Prompt asking the LLM to turn `question` into SQL for `schema`."""
+    return f"{SQL_PROMPT_PREFIX}{tables}\n\nDatabase Schema:\n{schema}\n\nUser Question:\n{question}\n"
+
+
+@lru_cache(maxsize=1)
+def frame_tokens():
+    """Tokens of the SQL prompt with no tables, schema or question."""
+    return count_tokens(build_sql_prompt([], "", ""))
+
+
+@timed("prompt")
+def assemble_sql_prompt(entry, question, token_budget=None):
+    """
+    Build the SQL prompt for `question` within PROMPT_TOKEN_BUDGET tokens.
+
+    What is left after the static prefix and the question goes to the table
+    list and the schema: retrieval picks tables to fit it, then, if the rendered prompt is still
+    over budget, trailing tables are dropped and as a last resort the
+    schema text is truncated.
+    Returns (prompt, table names, prompt token count).
+    """
+    token_budget = token_budget or settings.PROMPT_TOKEN_BUDGET
+    schema_budget = token_budget - frame_tokens() - count_tokens(question)
+    if schema_budget <= 0:
+        raise ValueError("Question is too long for the prompt token budget")
+    schema_budget = min(schema_budget, settings.SCHEMA_RETRIEVAL_TOKEN_BUDGET)
+
+    tables, schema = select_tables(entry, question, token_budget=schema_budget)
+    prompt = build_sql_prompt(tables, schema, question)
+    tokens = count_tokens(prompt)
+    while tokens > token_budget and len(tables) > 1:
+        tables = tables[:-1]
+        schema = schema_text(entry, tables)
+        prompt = build_sql_prompt(tables, schema, question)
+        tokens = count_tokens(prompt)
+    if tokens > token_budget:
+        schema = truncate_to_tokens(schema, max(count_tokens(schema) - (tokens - token_budget), 0))
+        prompt = build_sql_prompt(tables, schema, question)
+        tokens = count_tokens(prompt)
+    return prompt, tables, tokens
+
+
+def build_answer_prompt(user_question, sql_query, digest):
+    """Prompt asking the LLM to explain a result digest in plain language."""
+    return f"""
+You are a helpful assistant that explains database query results in very simple and clear language.
+
+Context:
+- The user originally asked: "{user_question}"
+- The SQL query that was executed: {sql_query}
+- Summary of the database results (row count, per-column statistics and a sample of rows): {digest}
+
+Instructions:
+1. Always start your explanation with: "For your data, ..."
+2. Summarize the results in plain English, as if explaining to a non-technical person.
+3. Be clear and concise. Avoid technical SQL or database jargon.
+4. If the result has numbers (like counts, averages, percentages), highlight them clearly.
+5. If multiple rows are present, describe the key insights (not just listing them blindly).
+6. Keep the explanation friendly and easy to understand.
+
+Now give the explanation:
+"""
+
+
+def clean_sql(text):
+    """Strip the ```sql fences the LLM sometimes wraps its answer in."""
+    sql_query = text.strip()
+    if sql_query.startswith("```sql"):
+        sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
+    elif sql_query.startswith("```"):
+        sql_query = sql_query.replace("```", "").strip()
+    return sql_query
+
+
+class SQLFenceStripper:
+    """
+    Incremental version of clean_sql for streamed LLM output.
+
+    feed() returns the part of the cleaned text that is already final; text
+    that might still turn into a fence (a trailing partial "```sql") or be
+    stripped (trailing whitespace) is held back until the next chunk or
+    finish(). The concatenated output equals clean_sql() of the full text.
+    """
+
+    def __init__(self):
+        self.fences = None
+        self.buffer = ""
+        self.started = False
+
+    def _decide(self):
+        head = self.buffer.lstrip()
+        if head.startswith("```sql"):
+            self.fences = ("```sql", "```")
+        elif head.startswith("```"):
+            self.fences = ("```",)
+        else:
+            self.fences = ()
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        if self.fences is None:
+            if "```sql".startswith(self.buffer.lstrip()):
+                return ""  # still can't tell whether the answer is fenced
+            self._decide()
+
+        text, hold = self._scan(final=False)
+        final = text.rstrip()
+        self.buffer = text[len(final):] + hold
+        return final
+
+    def finish(self):
+        if self.fences is None:
+            self._decide()
+        text, _ = self._scan(final=True)
+        self.buffer = ""
+        return text.rstrip()
+
+    def _scan(self, final):
+        """Drop fences from the buffer; return (text, unfinished tail)."""
+        buffer = self.buffer
+        out = []
+        i = 0
+        while i < len(buffer):
+            rest = buffer[i:i + 6]
+            if not final and any(len(rest) < len(f) and f.startswith(rest) for f in self.fences):
+                break
+            fence = next((f for f in self.fences if buffer.startswith(f, i)), None)
+            if fence:
+                i += len(fence)
+            else:
+                out.append(buffer[i])
+                i += 1
+        text = "".join(out)
+        if not self.started:
+            text = text.lstrip()
+            self.started = bool(text)
+        return text, buffer[i:]
@@ -0,0 +1,96 @@
+import base64
+import datetime
+import decimal
+
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.text2sql.columnar+json"
+LAYOUTS = ("rows", "columns")
+
+
+def default(value):
+    """orjson fallback for the values database drivers return."""
+    if isinstance(value, decimal.Decimal):
+        # As a string, like DRF's decimal fields, so no precision is lost
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+def dumps(payload):
+    return orjson.dumps(payload, default=default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def to_columnar(rows, layout="rows"):
+    """
+    Turn a list of row dicts into {"columns", "rows"} (row arrays) or
+    {"columns", "values"} (one array per column) for layout "columns".
+    """
+    columns = list(rows[0].keys()) if rows else []
+    if layout == "columns":
+        return {"columns": columns, "values": [[row[c] for row in rows] for c in columns]}
+    return {"columns": columns, "rows": [list(row.values()) for row in rows]}
+
+
+def columnar_layout(media_type):
+    """Layout requested by a columnar media type's `layout` parameter."""
+    for param in (media_type or "").split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip() == "layout" and value.strip().strip('"') in LAYOUTS:
+            return value.strip().strip('"')
+    return "rows"
+
+
+def accepts_columnar(accept_header):
+    """Columnar layout asked for in an Accept header, or None."""
+    for media_type in (accept_header or "").split(","):
+        if media_type.split(";")[0].strip() == COLUMNAR_MEDIA_TYPE:
+            return columnar_layout(media_type)
+    return None
+
+
+def render_columnar(payload, layout="rows"):
+    """
+    Render a response envelope with orjson, converting `data.rows` (a list
+    of row dicts) to the columnar layout.
+    """
+    data = payload.get("data") if isinstance(payload, dict) else None
+    if isinstance(data, dict) and isinstance(data.get("rows"), list):
+        columnar = {}
+        for key, value in data.items():
+            if key == "rows":
+                columnar.update(to_columnar(value, layout))
+            else:
+                columnar[key] = value
+        payload = {**payload, "data": columnar}
+    return dumps(payload)
+
+
+class ColumnarJSONRenderer(BaseRenderer):
+    """
+    Opt-in compact rendering of query results, negotiated with
+    `Accept: application/vnd.text2sql.columnar+json` (add `; layout=columns`
+    for column-major arrays).
+    """
+
+    media_type = COLUMNAR_MEDIA_TYPE
+    format = "columnar"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return render_columnar(data, columnar_layout(accepted_media_type))
+
+
+# Renderers of views that return query rows: the defaults first, so plain
+# JSON stays the format for clients that don't ask for columnar.
+ROW_RENDERERS = list(api_settings.DEFAULT_RENDERER_CLASSES) + [ColumnarJSONRenderer]
@@ -0,0 +1,225 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import sqlparse
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+from sqlparse import tokens as T
+
+from .metrics import metrics
+from .models import ResultCacheVersion
+from .schema_cache import connection_key
+from .sql_utils import strip_statement
+
+
+# Keywords directly followed by the table(s) a statement reads or changes.
+TABLE_KEYWORDS = {"FROM", "JOIN", "INTO", "UPDATE", "TABLE", "TRUNCATE", "ON"}
+# Keywords that may sit between one of the above and the table name.
+TABLE_MODIFIERS = {"IF", "NOT", "EXISTS", "ONLY", "IGNORE"}
+# Pseudo-tables of the shared write counters: every write bumps ANY_WRITE,
+# writes whose tables can't be told also bump UNKNOWN_WRITE.
+ANY_WRITE = "+"
+UNKNOWN_WRITE = "*"
+
+
+def canonical_sql(sql_query):
+    """
+    SQL with comments removed, keywords upper-cased and whitespace collapsed,
+    so trivially different spellings of a query share a cache entry.
+    """
+    formatted = sqlparse.format(
+        strip_statement(sql_query), keyword_case="upper", strip_comments=True, strip_whitespace=True
+    )
+    # Collapse whitespace between tokens only; string literals stay as written
+    parts = []
+    for statement in sqlparse.parse(formatted):
+        for token in statement.flatten():
+            if not token.is_whitespace:
+                parts.append(token.value)
+            elif parts and parts[-1] != " ":
+                parts.append(" ")
+    return "".join(parts).strip()
+
+
+def referenced_tables(sql_query):
+    """Lower-cased names of the tables a statement reads or writes."""
+    tables = set()
+    for statement in sqlparse.parse(sql_query):
+        expecting = False
+        in_list = False
+        previous = None
+        qualifier = None  # name just added, dropped again if a "." follows it
+        for token in statement.flatten():
+            if token.is_whitespace or token.ttype in T.Comment:
+                continue
+            if token.ttype in T.Keyword and expecting and token.normalized in TABLE_MODIFIERS:
+                continue
+            if token.ttype in T.Keyword and in_list and token.normalized == "AS":
+                continue  # FROM t AS alias, ...: the alias follows, the list goes on
+            if token.ttype in T.Keyword:
+                expecting = token.normalized in TABLE_KEYWORDS or token.normalized.endswith("JOIN")
+                in_list = False
+            elif token.ttype in T.Name or token.ttype in T.String.Symbol:
+                name = token.value.strip('`"[]').lower()
+                qualifier = None
+                if expecting or (previous is not None and previous.match(T.Punctuation, ".") and in_list):
+                    # schema.table: keep the table part
+                    if name not in tables:
+                        qualifier = name
+                    tables.add(name)
+                    expecting = False
+                    in_list = True
+            elif token.match(T.Punctuation, "."):
+                if qualifier is not None and previous.ttype in (T.Name, T.String.Symbol):
+                    tables.discard(qualifier)
+                qualifier = None
+            elif token.match(T.Punctuation, ","):
+                expecting = in_list
+                qualifier = None
+            else:
+                expecting = False
+                in_list = False
+                qualifier = None
+            previous = token
+    return tables
+
+
+def version_keys(tables):
+    """Write counters a result reading `tables` depends on."""
+    return {table[:255] for table in tables} | {UNKNOWN_WRITE} if tables else {UNKNOWN_WRITE, ANY_WRITE}
+
+
+def bumped_keys(tables):
+    """Write counters a statement writing `tables` bumps."""
+    return {table[:255] for table in tables} | {ANY_WRITE} if tables else {UNKNOWN_WRITE, ANY_WRITE}
+
+
+class ResultCache:
+    """
+    Per-worker LRU of executed read-query results.
+
+    Entries are keyed by connection identity, canonical SQL and page size,
+    expire after RESULT_CACHE_TTL seconds, and are dropped as soon as a
+    statement run through execute-db writes to a table they read.
+
+    With RESULT_CACHE_SHARED_INVALIDATION, writes also bump per-table
+    counters in the Django database (ResultCacheVersion). Entries remember
+    the counters they were stored at and are only served while those are
+    unchanged, so a write on one worker invalidates every worker's results.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()  # key -> (result, stored_at, connection, tables, versions)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def key(self, engine, sql_query, page_size):
+        raw = f"{connection_key(engine)}:{page_size}:{canonical_sql(sql_query)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, engine, sql_query, page_size):
+        key = self.key(engine, sql_query, page_size)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and now - cached[1] > settings.RESULT_CACHE_TTL:
+                cached = None
+        if cached is not None and settings.RESULT_CACHE_SHARED_INVALIDATION:
+            if self._load_versions(cached[2], version_keys(cached[3])) != cached[4]:
+                cached = None  # written to on some worker since
+        with self._lock:
+            if cached is not None:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self._entries.pop(key, None)
+                self.misses += 1
+        metrics.inc("text2sql_cache_requests_total", cache="result", result="miss" if cached is None else "hit")
+        return None if cached is None else cached[0]
+
+    def versions(self, engine, sql_query):
+        """
+        Shared write counters of the tables `sql_query` reads, to be taken
+        before it runs and passed to set(). None when they can't be read.
+        """
+        if not settings.RESULT_CACHE_SHARED_INVALIDATION:
+            return {}
+        return self._load_versions(connection_key(engine), version_keys(referenced_tables(sql_query)))
+
+    def set(self, engine, sql_query, page_size, result, versions=None):
+        if len(result[0]) > settings.RESULT_CACHE_MAX_ROWS:
+            return
+        if versions is None:
+            return  # unknown counters: the entry could never be validated
+        key = self.key(engine, sql_query, page_size)
+        tables = referenced_tables(sql_query)
+        with self._lock:
+            self._entries[key] = (result, time.monotonic(), connection_key(engine), tables, versions)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.RESULT_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, engine, sql_query=None):
+        """
+        Drop the entries of `engine` that read a table `sql_query` touches,
+        or all of them when no statement is given or its tables are unknown.
+        """
+        connection = connection_key(engine)
+        tables = referenced_tables(sql_query) if sql_query else set()
+        with self._lock:
+            stale = [
+                key for key, (result, stored_at, entry_connection, entry_tables, versions) in self._entries.items()
+                if entry_connection == connection
+                and (not tables or not entry_tables or tables & entry_tables)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        if settings.RESULT_CACHE_SHARED_INVALIDATION:
+            self._bump(connection, tables)
+
+    # The shared counters are best effort on the write side: if they can't be
+    # bumped, other workers' entries still expire after RESULT_CACHE_TTL. A
+    # failed read is a miss, never a stale hit.
+
+    def _load_versions(self, connection, keys):
+        try:
+            found = dict(
+                ResultCacheVersion.objects.filter(connection=connection, table__in=keys)
+                .values_list("table", "version")
+            )
+        except DatabaseError:
+            return None
+        return {key: found.get(key, 0) for key in keys}
+
+    def _bump(self, connection, tables):
+        keys = bumped_keys(tables)
+        try:
+            ResultCacheVersion.objects.bulk_create(
+                [ResultCacheVersion(connection=connection, table=key) for key in keys], ignore_conflicts=True
+            )
+            ResultCacheVersion.objects.filter(connection=connection, table__in=keys).update(
+                version=F("version") + 1
+            )
+        except DatabaseError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidated": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+result_cache = ResultCache()
@@ -0,0 +1,117 @@
+import datetime
+import decimal
+import json
+
+from django.conf import settings
+
+from .metrics import timed
+from .tokens import count_tokens
+
+
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+def column_kind(values):
+    """Classify the non-null values of a column."""
+    if not len(values):
+        return "null"
+    if all(isinstance(v, bool) for v in values):
+        return "boolean"
+    if all(isinstance(v, (int, float, decimal.Decimal)) and not isinstance(v, bool) for v in values):
+        return "numeric"
+    if all(isinstance(v, (datetime.date, datetime.time)) for v in values):
+        return "temporal"
+    return "text"
+
+
+def summarize_column(name, column, top_k):
+    """Statistics of one result column, computed on a NumPy object array."""
+    import numpy as np
+
+    nulls = np.equal(column, None)
+    values = column[~nulls]
+    kind = column_kind(values)
+    summary = {"name": name, "type": kind, "nulls": int(nulls.sum())}
+
+    if kind == "numeric":
+        numbers = values.astype(np.float64)
+        q25, q50, q75 = np.quantile(numbers, QUANTILES)
+        summary.update(
+            min=float(numbers.min()),
+            max=float(numbers.max()),
+            mean=round(float(numbers.mean()), 4),
+            p25=float(q25),
+            median=float(q50),
+            p75=float(q75),
+        )
+    elif kind == "temporal":
+        summary.update(min=str(values.min()), max=str(values.max()))
+
+    if kind in ("text", "boolean", "temporal", "numeric") and len(values):
+        text = np.fromiter(map(str, values), dtype=object, count=len(values))
+        labels, counts = np.unique(text, return_counts=True)
+        summary["distinct"] = int(len(labels))
+        if counts.max() > 1 and (kind != "numeric" or len(labels) <= top_k):
+            order = np.argsort(-counts, kind="stable")[:top_k]
+            summary["top_values"] = {str(labels[i]): int(counts[i]) for i in order}
+    return summary
+
+
+def sample_rows(rows, size):
+    """Up to `size` rows spread evenly over the result (all rows if fewer)."""
+    import numpy as np
+
+    if len(rows) <= size:
+        return rows
+    indices = np.linspace(0, len(rows) - 1, num=size).round().astype(int)
+    return [rows[i] for i in np.unique(indices)]
+
+
+@timed("digest")
+def build_digest(rows, more_rows=False, token_budget=None, sample_size=None, top_k=None):
+    """
+    Compact description of a result set for the NL-answer prompt: row count,
+    per-column type, null count, numeric ranges and quantiles, top values and
+    an evenly spaced sample. The sample, then the top-k lists, then trailing
+    columns are trimmed until the rendered digest fits `token_budget`.
+    NumPy is imported on first use to keep it out of worker startup.
+    """
+    import numpy as np
+
+    token_budget = token_budget or settings.RESULT_DIGEST_TOKEN_BUDGET
+    sample_size = sample_size or settings.RESULT_DIGEST_SAMPLE_ROWS
+    top_k = top_k or settings.RESULT_DIGEST_TOP_K
+
+    columns = list(rows[0].keys()) if rows else []
+    arrays = {
+        name: np.fromiter((row[name] for row in rows), dtype=object, count=len(rows))
+        for name in columns
+    }
+
+    digest = {
+        "row_count": len(rows),
+        "more_rows_available": more_rows,
+        "columns": [summarize_column(name, arrays[name], top_k) for name in columns],
+        "sample_rows": sample_rows(rows, sample_size),
+    }
+
+    rendered = render_digest(digest)
+    while count_tokens(rendered) > token_budget:
+        if len(digest["sample_rows"]) > 1:
+            digest["sample_rows"] = sample_rows(digest["sample_rows"], len(digest["sample_rows"]) // 2)
+        elif any("top_values" in c for c in digest["columns"]):
+            for c in digest["columns"]:
+                c.pop("top_values", None)
+        elif len(digest["columns"]) > 1:
+            digest["columns"] = digest["columns"][:-1]
+            kept = [c["name"] for c in digest["columns"]]
+            digest["sample_rows"] = [{name: row[name] for name in kept} for row in digest["sample_rows"]]
+            digest["columns_truncated"] = True
+        else:
+            break
+        rendered = render_digest(digest)
+    return rendered
+
+
+def render_digest(digest):
+    return json.dumps(digest, default=str, separators=(",", ":"))
@@ -0,0 +1,349 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.types import NullType
+
+from .metrics import metrics, timed
+
+
+# Cheap catalog queries whose result changes whenever a table or column is
+# added, dropped or retyped. They only touch the catalog, so they stay fast
+# even on databases with hundreds of tables.
+FINGERPRINT_QUERIES = {
+    # pg_catalog directly: the information_schema views are slow on large
+    # catalogs. Same relations as information_schema.columns (tables,
+    # partitioned tables, views, foreign tables); the type modifier catches
+    # changes such as varchar(20) -> varchar(50).
+    "postgresql": """
+        SELECT md5(string_agg(
+            c.relname || '.' || a.attname || ':' || a.atttypid || ':' || a.atttypmod, ','
+            ORDER BY c.relname, a.attnum
+        ))
+        FROM pg_catalog.pg_attribute a
+        JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema()
+          AND c.relkind IN ('r', 'p', 'v', 'f')
+          AND a.attnum > 0
+          AND NOT a.attisdropped
+    """,
+    "mysql": """
+        SELECT CONCAT(COUNT(*), '-', COALESCE(SUM(CRC32(CONCAT_WS(
+            '.', table_name, column_name, column_type, ordinal_position
+        ))), 0))
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+    """,
+    "sqlite": """
+        SELECT group_concat(name || ':' || coalesce(sql, ''), ';')
+        FROM (SELECT name, sql FROM sqlite_master ORDER BY name)
+    """,
+}
+
+
+def connection_key(engine):
+    """Stable identifier for the database an engine points at."""
+    url = engine.url.render_as_string(hide_password=False)
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def fingerprint(engine):
+    """Return a hash of the catalog, or None when the dialect has no query."""
+    query = FINGERPRINT_QUERIES.get(engine.dialect.name)
+    if query is None:
+        return None
+    with engine.connect() as conn:
+        value = conn.execute(text(query)).scalar()
+    return hashlib.sha256(str(value).encode()).hexdigest()
+
+
+def render_table(table, engine):
+    """Render a reflected table the same way SQLDatabase.get_table_info does."""
+    for column in list(table.columns):
+        if type(column.type) is NullType:
+            table._columns.remove(column)
+    return str(CreateTable(table).compile(engine)).rstrip()
+
+
+def describe_table(table):
+    """Names, keys, comments and foreign-key neighbours of a reflected table."""
+    return {
+        "columns": [column.name for column in table.columns],
+        "primary_key": [column.name for column in table.primary_key.columns],
+        "comments": [
+            comment for comment in
+            [table.comment] + [column.comment for column in table.columns]
+            if comment
+        ],
+        "foreign_keys": sorted({fk.column.table.name for fk in table.foreign_keys}),
+    }
+
+
+# Reflection of large schemas is split into batches of tables that run
+# concurrently; each batch is one MetaData.reflect() call, which SQLAlchemy
+# answers with multi-table catalog queries where the dialect supports them.
+reflection_executor = ThreadPoolExecutor(
+    max_workers=settings.SCHEMA_REFLECT_THREADS, thread_name_prefix="text2sql-reflect"
+)
+# Runs the background warm-up jobs started by connect-db.
+warmup_executor = ThreadPoolExecutor(
+    max_workers=settings.SCHEMA_WARMUP_THREADS, thread_name_prefix="text2sql-warmup"
+)
+
+
+class ReflectionProgress:
+    """State of one schema reflection, reported by the schema-status endpoint."""
+
+    def __init__(self):
+        self.state = "queued"
+        self.tables_total = None
+        self.tables_reflected = 0
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def start(self, total):
+        with self._lock:
+            self.state = "running"
+            self.tables_total = total
+            self.started_at = self.started_at or time.monotonic()
+
+    def advance(self, count):
+        with self._lock:
+            self.tables_reflected += count
+
+    def finish(self, error=None):
+        with self._lock:
+            self.state = "failed" if error else "ready"
+            self.error = str(error) if error else None
+            self.finished_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            end = self.finished_at or time.monotonic()
+            return {
+                "state": self.state,
+                "tables_total": self.tables_total,
+                "tables_reflected": self.tables_reflected,
+                "elapsed_ms": round((end - self.started_at) * 1000, 1) if self.started_at else 0.0,
+                "error": self.error,
+            }
+
+
+def reflect_tables(engine, names):
+    """Reflect `names` in one MetaData and return ({table: DDL}, {table: description})."""
+    metadata = MetaData()
+    metadata.reflect(bind=engine, only=names)
+    wanted = set(names)
+    table_info = {}
+    table_meta = {}
+    for table in metadata.sorted_tables:
+        if table.name in wanted:
+            table_info[table.name] = render_table(table, engine)
+            table_meta[table.name] = describe_table(table)
+    return table_info, table_meta
+
+
+def reflect_schema(engine, progress=None):
+    """
+    Reflect every table and return (table names, {table: rendered DDL},
+    {table: description}). Batches of SCHEMA_REFLECT_BATCH_SIZE tables are
+    reflected concurrently on the reflection pool.
+    """
+    tables = inspect(engine).get_table_names()
+    if progress is not None:
+        progress.start(len(tables))
+    size = settings.SCHEMA_REFLECT_BATCH_SIZE
+    batches = [tables[i:i + size] for i in range(0, len(tables), size)]
+
+    def reflect_batch(names):
+        result = reflect_tables(engine, names)
+        if progress is not None:
+            progress.advance(len(names))
+        return result
+
+    if len(batches) > 1:
+        results = list(reflection_executor.map(reflect_batch, batches))
+    else:
+        results = [reflect_batch(names) for names in batches]
+
+    table_info = {}
+    table_meta = {}
+    for info, meta in results:
+        table_info.update(info)
+        table_meta.update(meta)
+    return tables, table_info, table_meta
+
+
+class SchemaEntry:
+    """Rendered schema of one database plus the fingerprint it was built at."""
+
+    def __init__(self, tables, table_info, table_meta, fingerprint):
+        self.tables = tables
+        self.table_info = table_info
+        self.table_meta = table_meta
+        self.fingerprint = fingerprint
+        self.index = None  # built lazily by schema_retrieval
+        self.token_counts = None  # likewise
+        self.column_stats = {}  # table -> (note, tokens, profiled_at), filled by column_stats
+        self.fetched_at = time.monotonic()
+        self.checked_at = self.fetched_at
+        self.schema = "\n\n".join(sorted(table_info.values()))
+        self.schema_hash = hashlib.sha256(self.schema.encode()).hexdigest()
+
+
+def carry_column_stats(previous, entry):
+    """Keep the column statistics of tables whose definition did not change."""
+    # list(): the profiler may be adding to previous.column_stats meanwhile
+    for table, stats in list(previous.column_stats.items()):
+        if entry.table_info.get(table) == previous.table_info.get(table):
+            entry.column_stats[table] = stats
+
+
+class SchemaCache:
+    """
+    Per-connection cache of the rendered schema text and table list.
+
+    An entry is rebuilt when it is older than SCHEMA_CACHE_TTL or when the
+    catalog fingerprint changes. The fingerprint is re-checked at most once
+    every SCHEMA_CACHE_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._locks = {}
+        self._progress = {}  # key -> ReflectionProgress of the latest reflection
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    @timed("schema")
+    def get(self, engine, force=False):
+        key = connection_key(engine)
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry is not None and not force and self._is_fresh(entry, engine):
+                metrics.inc("text2sql_cache_requests_total", cache="schema", result="hit")
+                return entry
+
+            metrics.inc("text2sql_cache_requests_total", cache="schema", result="miss")
+            with self._lock:
+                progress = self._progress.get(key)
+                if progress is None or progress.state != "queued":
+                    progress = self._progress[key] = ReflectionProgress()
+            try:
+                # Taken first: DDL during the reflection then leaves the entry stale, not fresh
+                version = fingerprint(engine)
+                tables, table_info, table_meta = reflect_schema(engine, progress)
+                previous, entry = entry, SchemaEntry(tables, table_info, table_meta, version)
+            except Exception as e:
+                progress.finish(e)
+                raise
+            if previous is not None:
+                carry_column_stats(previous, entry)
+            self._entries[key] = entry
+            progress.finish()
+            return entry
+
+    def warm(self, engine):
+        """
+        Reflect the schema of `engine` in the background unless it is cached
+        or already being reflected. Returns the status snapshot.
+        """
+        key = connection_key(engine)
+        with self._lock:
+            progress = self._progress.get(key)
+            busy = progress is not None and progress.state in ("queued", "running")
+            if busy or key in self._entries:
+                return self._status(key)
+            self._progress[key] = ReflectionProgress()
+        warmup_executor.submit(self._warm, engine)
+        return self.status(engine)
+
+    def _warm(self, engine):
+        try:
+            self.get(engine)
+        except Exception:
+            pass  # recorded on the progress; the next request retries
+
+    def status(self, engine):
+        """Progress of the latest reflection of `engine`'s schema."""
+        with self._lock:
+            return self._status(connection_key(engine))
+
+    def _status(self, key):
+        progress = self._progress.get(key)
+        if progress is not None:
+            return progress.snapshot()
+        return {
+            "state": "ready" if key in self._entries else "not_started",
+            "tables_total": None,
+            "tables_reflected": 0,
+            "elapsed_ms": 0.0,
+            "error": None,
+        }
+
+    def _is_fresh(self, entry, engine):
+        now = time.monotonic()
+        if now - entry.fetched_at > settings.SCHEMA_CACHE_TTL:
+            return False
+        if now - entry.checked_at < settings.SCHEMA_CACHE_CHECK_INTERVAL:
+            return True
+        if fingerprint(engine) != entry.fingerprint:
+            return False
+        entry.checked_at = now
+        return True
+
+    @timed("schema_refresh")
+    def refresh_tables(self, engine, names):
+        """
+        Re-reflect only the tables named in `names` (lower-cased) after DDL,
+        together with tables that reference them and tables missing from the
+        entry, and drop tables that no longer exist. Without a cached entry
+        there is nothing to patch: the next get() reflects everything.
+        """
+        key = connection_key(engine)
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            version = fingerprint(engine)  # before reflecting, as in get()
+            tables = inspect(engine).get_table_names()
+            stale = [
+                table for table in tables
+                if table.lower() in names
+                or table not in entry.table_info
+                or names & {neighbour.lower() for neighbour in entry.table_meta[table]["foreign_keys"]}
+            ]
+            table_info, table_meta = reflect_tables(engine, stale) if stale else ({}, {})
+            for table in tables:
+                if table not in table_info and table in entry.table_info:
+                    table_info[table] = entry.table_info[table]
+                    table_meta[table] = entry.table_meta[table]
+            previous, entry = entry, SchemaEntry(tables, table_info, table_meta, version)
+            carry_column_stats(previous, entry)
+            self._entries[key] = entry
+            return entry
+
+    def peek(self, engine):
+        """The cached entry of `engine`, without reflecting or checking freshness."""
+        return self._entries.get(connection_key(engine))
+
+    def invalidate(self, engine):
+        key = connection_key(engine)
+        with self._lock:
+            self._entries.pop(key, None)
+            progress = self._progress.get(key)
+            if progress is not None and progress.state not in ("queued", "running"):
+                del self._progress[key]
+
+
+schema_cache = SchemaCache()
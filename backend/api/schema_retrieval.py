@@ -0,0 +1,165 @@
+import math
+import re
+from collections import Counter
+
+from django.conf import settings
+
+from .column_stats import stats_note, stats_tokens
+from .tokens import count_tokens, truncate_to_tokens
+
+
+TOKEN_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+# Field weights: a table whose name matches the question is a much stronger
+# signal than one that merely has a matching column or foreign-key neighbour.
+TABLE_NAME_WEIGHT = 3
+COLUMN_WEIGHT = 1
+COMMENT_WEIGHT = 1
+NEIGHBOUR_WEIGHT = 1
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def normalize_token(token):
+    token = token.lower()
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("es") and token[-3] in "sxz":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Split identifiers and prose into normalized terms (snake/camel aware)."""
+    return [normalize_token(token) for token in TOKEN_RE.findall(text or "")]
+
+
+class SchemaIndex:
+    """BM25 index over table names, column names, comments and FK neighbours."""
+
+    def __init__(self, table_meta):
+        self.neighbours = {name: set() for name in table_meta}
+        for name, meta in table_meta.items():
+            for referred in meta["foreign_keys"]:
+                if referred in self.neighbours and referred != name:
+                    self.neighbours[name].add(referred)
+                    self.neighbours[referred].add(name)
+
+        self.documents = {}
+        for name, meta in table_meta.items():
+            terms = tokenize(name) * TABLE_NAME_WEIGHT
+            for column in meta["columns"]:
+                terms += tokenize(column) * COLUMN_WEIGHT
+            for comment in meta["comments"]:
+                terms += tokenize(comment) * COMMENT_WEIGHT
+            for neighbour in self.neighbours[name]:
+                terms += tokenize(neighbour) * NEIGHBOUR_WEIGHT
+            self.documents[name] = Counter(terms)
+
+        self.lengths = {name: sum(doc.values()) for name, doc in self.documents.items()}
+        self.avg_length = (sum(self.lengths.values()) / len(self.lengths)) if self.lengths else 0
+        doc_freq = Counter()
+        for doc in self.documents.values():
+            doc_freq.update(doc.keys())
+        total = len(self.documents)
+        self.idf = {
+            term: math.log(1 + (total - freq + 0.5) / (freq + 0.5))
+            for term, freq in doc_freq.items()
+        }
+
+    def score(self, question):
+        """Return {table: BM25 score} for every table matching the question."""
+        terms = set(tokenize(question))
+        scores = {}
+        for name, doc in self.documents.items():
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[name] / (self.avg_length or 1))
+            score = 0.0
+            for term in terms:
+                freq = doc.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (BM25_K1 + 1) / (freq + norm)
+            if score > 0:
+                scores[name] = score
+        return scores
+
+
+def get_index(entry):
+    """Return the retrieval index of a schema cache entry, building it once."""
+    if entry.index is None:
+        entry.index = SchemaIndex(entry.table_meta)
+    return entry.index
+
+
+def table_tokens(entry):
+    """
+    Return {table: token count of its DDL and of its entry in the prompt's
+    table list} for an entry, counting once.
+    """
+    if entry.token_counts is None:
+        entry.token_counts = {
+            name: count_tokens(info) + count_tokens(f"{name!r}, ")
+            for name, info in entry.table_info.items()
+        }
+    return entry.token_counts
+
+
+def schema_text(entry, names):
+    """
+    Schema text of the tables in `names`, in the order of entry.schema, each
+    DDL followed by its cached column statistics when there are any.
+    """
+    parts = []
+    for name in sorted(names, key=entry.table_info.get):
+        note = stats_note(entry, name)
+        parts.append(f"{entry.table_info[name]}\n{note}" if note else entry.table_info[name])
+    return "\n\n".join(parts)
+
+
+def select_tables(entry, question, top_k=None, token_budget=None):
+    """
+    Pick the tables whose schema is sent to the LLM for `question`.
+
+    The whole schema is used when it fits in the token budget. Otherwise the
+    top-k tables by BM25 score are taken, expanded one hop along foreign keys,
+    and added in rank order until the budget is spent. When not even the
+    top-ranked table fits, it is sent alone with its schema truncated.
+    Returns (selected table names, schema text).
+    """
+    top_k = top_k or settings.SCHEMA_RETRIEVAL_TOP_K
+    token_budget = token_budget or settings.SCHEMA_RETRIEVAL_TOKEN_BUDGET
+
+    costs = {name: tokens + stats_tokens(entry, name) for name, tokens in table_tokens(entry).items()}
+    if sum(costs.values()) <= token_budget:
+        if not entry.column_stats:
+            return sorted(entry.table_info), entry.schema
+        return sorted(entry.table_info), schema_text(entry, entry.table_info)
+
+    index = get_index(entry)
+    scores = index.score(question)
+    ranked = sorted(scores, key=lambda name: (-scores[name], name))[:top_k]
+
+    candidates = list(ranked)
+    for name in ranked:
+        for neighbour in sorted(index.neighbours[name]):
+            if neighbour not in candidates:
+                candidates.append(neighbour)
+    if not candidates:
+        candidates = sorted(entry.table_info)
+
+    selected = []
+    used = 0
+    for name in candidates:
+        cost = costs[name]
+        if used + cost > token_budget:
+            continue
+        selected.append(name)
+        used += cost
+
+    if not selected and candidates:
+        top = candidates[0]
+        budget = token_budget - count_tokens(f"{top!r}, ")
+        return [top], truncate_to_tokens(schema_text(entry, [top]), max(budget, 0))
+    return selected, schema_text(entry, selected)
@@ -0,0 +1,248 @@
+import decimal
+import time
+
+import sqlparse
+from django.conf import settings
+from sqlalchemy import text
+from sqlparse import sql as S, tokens as T
+
+from .sql_utils import strip_statement
+
+
+# Transaction control is dropped from scripts, which always run in one
+# transaction of their own; a COMMIT in the middle would make a later
+# failure impossible to roll back.
+TRANSACTION_STATEMENTS = {"BEGIN", "START", "COMMIT", "END"}
+# Partial rollbacks can't be honoured inside that transaction.
+REJECTED_STATEMENTS = {"ROLLBACK", "SAVEPOINT", "RELEASE"}
+# Bind parameters per multi-row INSERT, under PostgreSQL's 65535 and
+# SQLite's 32766.
+MAX_INSERT_PARAMS = 30000
+
+
+class ScriptError(Exception):
+    """A statement of a script failed; the whole script was rolled back."""
+
+    def __init__(self, indexes, error):
+        self.indexes = indexes
+        if len(indexes) == 1:
+            label = f"Statement {indexes[0]}"
+        else:
+            label = f"Batched statements {indexes[0]}-{indexes[-1]}"
+        super().__init__(f"{label} failed, the script was rolled back: {error}")
+
+
+def without_trailing_comments(statement):
+    """
+    `statement` without the comments after its end; sqlparse.split() keeps
+    a `-- ...` that follows the semicolon with the statement before it.
+    """
+    tokens = list(sqlparse.parse(statement)[0].flatten()) if statement.strip() else []
+    while tokens and (
+        tokens[-1].is_whitespace or tokens[-1].ttype in T.Comment or tokens[-1].match(T.Punctuation, ";")
+    ):
+        tokens.pop()
+    return "".join(token.value for token in tokens)
+
+
+def split_statements(sql_query):
+    """
+    The non-empty statements of a script, without trailing semicolons or
+    transaction control (BEGIN, START TRANSACTION, COMMIT, END). Raises
+    ValueError for scripts with ROLLBACK or SAVEPOINT.
+    """
+    statements = []
+    for statement in sqlparse.split(sql_query):
+        stripped = strip_statement(without_trailing_comments(statement))
+        code = sqlparse.format(stripped, strip_comments=True).strip() if stripped else ""
+        if not code:
+            continue
+        verb = code.split(None, 1)[0].upper()
+        if verb in REJECTED_STATEMENTS:
+            raise ValueError(f"{verb} is not supported: scripts always run in a single transaction")
+        if verb in TRANSACTION_STATEMENTS and (verb != "START" or code.upper().split()[1:2] == ["TRANSACTION"]):
+            continue
+        statements.append(stripped)
+    return statements
+
+
+def literal_value(tokens):
+    """
+    Python value of a VALUES item made of `tokens`. Raises ValueError for
+    anything but a plain number, string, NULL or boolean literal.
+    """
+    sign = ""
+    if len(tokens) == 2 and tokens[0].ttype in T.Operator and tokens[0].value in "+-":
+        sign, tokens = tokens[0].value, tokens[1:]
+    if len(tokens) != 1:
+        raise ValueError("not a literal")
+    token = tokens[0]
+    if token.ttype in T.Number.Integer:
+        return int(sign + token.value)
+    if token.ttype in T.Number.Float:
+        # Decimal keeps the literal's precision; the driver renders it back as is
+        return decimal.Decimal(sign + token.value)
+    if token.ttype in T.String.Single and not sign and "\\" not in token.value:
+        return token.value[1:-1].replace("''", "'")
+    if token.ttype in T.Keyword and not sign:
+        if token.normalized == "NULL":
+            return None
+        if token.normalized in ("TRUE", "FALSE"):
+            return token.normalized == "TRUE"
+    raise ValueError("not a literal")
+
+
+def row_values(parenthesis):
+    """Values of one `(...)` row of a VALUES clause."""
+    values = []
+    item = []
+    for token in parenthesis.flatten():
+        if token.is_whitespace or token.match(T.Punctuation, "(") or token.match(T.Punctuation, ")"):
+            continue
+        if token.match(T.Punctuation, ","):
+            values.append(literal_value(item))
+            item = []
+        else:
+            item.append(token)
+    values.append(literal_value(item))
+    return values
+
+
+def insert_shape(statement):
+    """
+    Split `INSERT INTO t [(columns)] VALUES (...), ...` into (prefix, rows)
+    when every value is a literal. Returns None for any other statement,
+    including INSERT IGNORE, INSERT ... SELECT and ON CONFLICT clauses.
+    """
+    parsed = sqlparse.parse(statement)[0]
+    tokens = [
+        t for t in parsed.tokens
+        if not t.is_whitespace and t.ttype not in T.Comment and not isinstance(t, S.Comment)
+    ]
+    if len(tokens) < 4 or not tokens[0].match(T.DML, "INSERT") or not tokens[1].match(T.Keyword, "INTO"):
+        return None
+    if not isinstance(tokens[-1], S.Values) or len(tokens) != 4:
+        return None
+    rows = []
+    try:
+        for token in tokens[-1].tokens:
+            if isinstance(token, S.Parenthesis):
+                rows.append(row_values(token))
+    except ValueError:
+        return None
+    if not rows or len({len(row) for row in rows}) != 1:
+        return None
+    prefix = " ".join(f"INSERT INTO {tokens[2]}".split())
+    return prefix, rows
+
+
+def coalesced(run, statements):
+    """Execution unit of a run of same-shaped INSERTs (see script_units)."""
+    if len(run) == 1:
+        index = run[0][0]
+        return [index], statements[index], None, None
+    return (
+        [index for index, _, _ in run],
+        run[0][1],
+        [row for _, _, rows in run for row in rows],
+        [len(rows) for _, _, rows in run],
+    )
+
+
+def script_units(statements):
+    """
+    Group the statements of a script into execution units: runs of two or
+    more INSERTs with the same prefix and row width become one multi-row
+    INSERT, everything else runs on its own. Yields (indexes, statement, rows,
+    rows per statement); rows is None for statements run as written.
+    """
+    run = []  # [(index, prefix, rows)] of the current run of INSERTs
+    for index, statement in enumerate(statements):
+        shape = insert_shape(statement)
+        if shape is not None and run and shape[0] == run[0][1] and len(shape[1][0]) == len(run[0][2][0]):
+            run.append((index, *shape))
+            continue
+        if run:
+            yield coalesced(run, statements)
+        run = [(index, *shape)] if shape is not None else []
+        if shape is None:
+            yield [index], statement, None, None
+    if run:
+        yield coalesced(run, statements)
+
+
+def insert_rows(conn, prefix, rows):
+    """
+    Insert `rows` with multi-row `INSERT ... VALUES (...), (...)` statements
+    of at most MAX_INSERT_PARAMS bind parameters. Returns the rowcount the
+    driver reported, or None when it reported none.
+    """
+    prefix = prefix.replace(":", "\\:")  # colons in the prefix are not bind parameters
+    width = len(rows[0])
+    size = max(1, MAX_INSERT_PARAMS // width)
+    total = 0
+    for start in range(0, len(rows), size):
+        chunk = rows[start:start + size]
+        values = ", ".join(
+            "(" + ", ".join(f":p{r}_{c}" for c in range(width)) + ")" for r in range(len(chunk))
+        )
+        params = {f"p{r}_{c}": value for r, row in enumerate(chunk) for c, value in enumerate(row)}
+        rowcount = conn.execute(text(f"{prefix} VALUES {values}"), params).rowcount
+        if rowcount is None or rowcount < 0:
+            return None
+        total += rowcount
+    return total
+
+
+def execute_script(engine, statements, page_size=None):
+    """
+    Run a multi-statement script in one transaction. Runs of same-shaped
+    `INSERT ... VALUES` statements are sent as multi-row INSERTs. Returns
+    (rows of the last statement that returned any, capped at `page_size`,
+    report).
+
+    Batched statements report "batch_rowcount", the driver's count for the
+    whole batch; their own "rowcount" is their number of VALUES rows, given
+    only when the batch count confirms every row was inserted.
+    """
+    page_size = min(page_size or settings.EXECUTE_PAGE_SIZE, settings.EXECUTE_MAX_PAGE_SIZE)
+    report = [None] * len(statements)
+    data = []
+    batches = 0
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for indexes, statement, rows, counts in script_units(statements):
+            unit_started = time.perf_counter()
+            batch_rowcount = None
+            try:
+                if rows is not None:
+                    batch_rowcount = insert_rows(conn, statement, rows)
+                    if batch_rowcount != len(rows):
+                        counts = [None] * len(indexes)
+                    batches += 1
+                else:
+                    result = conn.execute(text(statement))
+                    if result.returns_rows:
+                        columns = result.keys()
+                        data = [dict(zip(columns, row)) for row in result.fetchmany(page_size)]
+                        counts = [len(data)]
+                    else:
+                        counts = [result.rowcount if result.rowcount >= 0 else None]
+            except Exception as e:
+                raise ScriptError([index + 1 for index in indexes], e) from e
+            elapsed = round((time.perf_counter() - unit_started) * 1000, 2)
+            for index, count in zip(indexes, counts):
+                report[index] = {
+                    "statement": index + 1,
+                    "type": sqlparse.parse(statements[index])[0].get_type(),
+                    "rowcount": count,
+                    "batched": rows is not None,
+                    "elapsed_ms": elapsed,
+                }
+                if rows is not None:
+                    report[index]["batch_rowcount"] = batch_rowcount
+    return data, {
+        "statements": report,
+        "batches": batches,
+        "total_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
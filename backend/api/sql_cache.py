@@ -0,0 +1,121 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+from django.utils import timezone
+
+from .metrics import metrics
+from .models import GeneratedQuery
+
+
+def normalize_question(question):
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    question = re.sub(r"\s+", " ", question.lower()).strip()
+    return question.rstrip("?.!; ")
+
+
+def cache_key(question, schema_entry):
+    """Key on the normalized question and the schema the SQL was written for."""
+    raw = f"{schema_entry.schema_hash}:{normalize_question(question)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class SQLCache:
+    """
+    Two-tier cache of generated SQL.
+
+    The in-memory tier is an LRU of SQL_CACHE_MAX_ENTRIES entries per worker.
+    When SQL_CACHE_PERSISTENT is on, entries are also written to the Django
+    database so they survive restarts and are shared between workers. Both
+    tiers expire entries after SQL_CACHE_TTL seconds.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()  # key -> (sql, stored_at)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and now - cached[1] <= settings.SQL_CACHE_TTL:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                metrics.inc("text2sql_cache_requests_total", cache="sql", result="hit")
+                return cached[0]
+            self._entries.pop(key, None)
+
+        if settings.SQL_CACHE_PERSISTENT:
+            sql = self._load(key)
+            if sql is not None:
+                self._remember(key, sql)
+                with self._lock:
+                    self.persistent_hits += 1
+                metrics.inc("text2sql_cache_requests_total", cache="sql", result="hit")
+                return sql
+
+        with self._lock:
+            self.misses += 1
+        metrics.inc("text2sql_cache_requests_total", cache="sql", result="miss")
+        return None
+
+    def set(self, key, question, sql):
+        self._remember(key, sql)
+        if settings.SQL_CACHE_PERSISTENT:
+            self._store(key, question, sql)
+
+    # The persistent tier is best effort: a locked or unavailable database
+    # only costs a cache miss, never the request.
+
+    def _load(self, key):
+        cutoff = timezone.now() - timedelta(seconds=settings.SQL_CACHE_TTL)
+        try:
+            row = GeneratedQuery.objects.filter(key=key, created_at__gte=cutoff).first()
+            if row is None:
+                return None
+            GeneratedQuery.objects.filter(pk=row.pk).update(hits=F("hits") + 1)
+            return row.sql
+        except DatabaseError:
+            return None
+
+    def _store(self, key, question, sql):
+        cutoff = timezone.now() - timedelta(seconds=settings.SQL_CACHE_TTL)
+        try:
+            GeneratedQuery.objects.filter(created_at__lt=cutoff).delete()
+            GeneratedQuery.objects.update_or_create(
+                key=key,
+                defaults={"question": question, "sql": sql, "created_at": timezone.now()},
+            )
+        except DatabaseError:
+            pass
+
+    def _remember(self, key, sql):
+        with self._lock:
+            self._entries[key] = (sql, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.SQL_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.persistent_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+sql_cache = SQLCache()
@@ -0,0 +1,30 @@
+import sqlparse
+from sqlparse import tokens as T
+
+
+READ_PREFIXES = ("show", "desc", "describe", "explain")
+
+
+def is_read_query(sql_query):
+    """
+    True for statements that return rows instead of modifying data: one
+    SELECT by sqlparse's statement type (so WITH ... SELECT and leading
+    comments count), or SHOW, DESCRIBE and EXPLAIN.
+    """
+    statements = [s for s in sqlparse.parse(sql_query) if s.token_first(skip_cm=True)]
+    if len(statements) != 1:
+        return False
+    statement = statements[0]
+    if statement.get_type() == "SELECT":
+        # Still a write: WITH d AS (DELETE ... RETURNING ...) SELECT, SELECT ...
+        # INTO new_table, and the row locks of SELECT ... FOR UPDATE
+        return not any(
+            (token.ttype in T.DML and token.normalized != "SELECT") or token.match(T.Keyword, "INTO")
+            for token in statement.flatten()
+        )
+    return statement.token_first(skip_cm=True).normalized.lower().startswith(READ_PREFIXES)
+
+
+def strip_statement(sql_query):
+    """Remove surrounding whitespace and the trailing semicolon."""
+    return sql_query.strip().rstrip(";").strip()
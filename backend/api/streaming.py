@@ -0,0 +1,86 @@
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+from sqlalchemy import text
+
+from .metrics import metrics
+
+
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def ndjson_line(event, payload):
+    return json.dumps({"type": event, **payload}, cls=JSONEncoder) + "\n"
+
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, cls=JSONEncoder)}\n\n"
+
+
+def iter_query_chunks(engine, sql_query, max_rows=None, chunk_size=None):
+    """
+    Run a read query on a server-side cursor and yield (columns, rows) chunks
+    of at most `chunk_size` rows, stopping after `max_rows` rows in total.
+    Only one chunk is held in memory at a time. An empty result yields one
+    (columns, []) chunk, so consumers always learn the columns.
+    """
+    max_rows = max_rows or settings.EXECUTE_STREAM_MAX_ROWS
+    chunk_size = chunk_size or settings.EXECUTE_STREAM_CHUNK_SIZE
+    with engine.connect() as conn:
+        conn = conn.execution_options(stream_results=True, yield_per=chunk_size)
+        result = conn.execute(text(sql_query))
+        columns = list(result.keys())
+        remaining = max_rows
+        for partition in result.partitions(chunk_size):
+            rows = [list(row) for row in partition[:remaining]]
+            remaining -= len(rows)
+            metrics.inc("text2sql_rows_returned_total", len(rows))
+            yield columns, rows
+            if remaining <= 0:
+                break
+        if remaining == max_rows:
+            yield columns, []
+
+
+def stream_query(engine, sql_query, fmt, cost_estimate=None):
+    """
+    Yield the rows of `sql_query` as NDJSON lines or SSE events. The end
+    event carries the cost guard's `cost_estimate`, whose "limited_to" tells
+    that the guard capped the rows.
+    """
+    encode = sse_event if fmt == "sse" else ndjson_line
+    max_rows = settings.EXECUTE_STREAM_MAX_ROWS
+    limited_to = (cost_estimate or {}).get("limited_to")
+    row_count = 0
+    columns_sent = False
+    try:
+        for columns, rows in iter_query_chunks(engine, sql_query, max_rows=max_rows):
+            if not columns_sent:
+                yield encode("columns", {"columns": columns})
+                columns_sent = True
+            row_count += len(rows)
+            if rows:
+                yield encode("rows", {"rows": rows})
+        yield encode("end", {
+            "row_count": row_count,
+            "truncated": row_count >= min(max_rows, limited_to or max_rows),
+            "cost_estimate": cost_estimate,
+        })
+    except Exception as e:
+        yield encode("error", {"message": f"Failed to execute query: {str(e)}"})
+
+
+def event_stream_response(events, fmt="sse"):
+    response = StreamingHttpResponse(events, content_type=STREAM_FORMATS[fmt])
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # keep nginx from buffering the stream
+    return response
+
+
+def streaming_response(engine, sql_query, fmt, cost_estimate=None):
+    return event_stream_response(stream_query(engine, sql_query, fmt, cost_estimate), fmt)
@@ -1,3 +1,375 @@
-from django.test import TestCase
+import decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from .cost_guard import QueryCostExceeded, add_limit, guard_statement
+from .ddl import ddl_tables
+from .pagination import build_page_query, decode_page_token, encode_page_token, paginate, read_page
+from .prompts import SQLFenceStripper, assemble_sql_prompt, clean_sql, frame_tokens
+from .result_cache import canonical_sql, referenced_tables
+from .schema_cache import SchemaEntry
+from .script import ScriptError, execute_script, insert_shape, script_units, split_statements
+from .schema_retrieval import select_tables
+from .sql_utils import is_read_query
+from .tokens import count_tokens
+
+
+class ReferencedTablesTests(SimpleTestCase):
+
+    def test_select_and_joins(self):
+        self.assertEqual(referenced_tables("SELECT * FROM orders"), {"orders"})
+        self.assertEqual(
+            referenced_tables("SELECT * FROM orders o JOIN customer c ON o.cid = c.id") & {"orders", "customer"},
+            {"orders", "customer"},
+        )
+
+    def test_from_list_with_aliases(self):
+        self.assertEqual(referenced_tables("SELECT * FROM orders o, customer c"), {"orders", "customer"})
+        self.assertEqual(
+            referenced_tables("SELECT * FROM orders AS o, customer AS c WHERE o.cid = c.id"),
+            {"orders", "customer"},
+        )
+
+    def test_qualified_and_quoted_names(self):
+        self.assertEqual(referenced_tables('SELECT * FROM public."Orders"'), {"orders"})
+        self.assertEqual(referenced_tables("SELECT * FROM `shop`.`customer`"), {"customer"})
+
+    def test_writes(self):
+        self.assertEqual(referenced_tables("INSERT INTO orders VALUES (1)"), {"orders"})
+        self.assertEqual(referenced_tables("UPDATE customer SET name = 'x'"), {"customer"})
+        self.assertEqual(referenced_tables("DELETE FROM orders WHERE id = 1"), {"orders"})
+        self.assertEqual(referenced_tables("TRUNCATE orders"), {"orders"})
+        self.assertEqual(referenced_tables("DROP TABLE IF EXISTS orders, customer"), {"orders", "customer"})
+
+    def test_scripts(self):
+        self.assertEqual(
+            referenced_tables("UPDATE a SET x = 1; DELETE FROM b"),
+            {"a", "b"},
+        )
+
+
+class CanonicalSQLTests(SimpleTestCase):
+
+    def test_collapses_whitespace_case_and_comments(self):
+        self.assertEqual(
+            canonical_sql("select  *\n  from t -- all rows\n where id = 1;"),
+            canonical_sql("SELECT * FROM t WHERE id = 1"),
+        )
+
+    def test_keeps_string_literals(self):
+        self.assertEqual(canonical_sql("SELECT * FROM t WHERE name = 'a  b'"), "SELECT * FROM t WHERE name = 'a  b'")
+        self.assertNotEqual(
+            canonical_sql("SELECT * FROM t WHERE name = 'a b'"),
+            canonical_sql("SELECT * FROM t WHERE name = 'a  b'"),
+        )
+        self.assertNotEqual(
+            canonical_sql("SELECT * FROM t WHERE name = 'x'"),
+            canonical_sql("SELECT * FROM t WHERE name = 'X'"),
+        )
+
+
+class DDLTablesTests(SimpleTestCase):
+
+    def test_not_ddl(self):
+        self.assertEqual(ddl_tables("SELECT * FROM t"), (False, set()))
+        self.assertEqual(ddl_tables("INSERT INTO t VALUES (1)"), (False, set()))
+        self.assertEqual(ddl_tables("TRUNCATE t"), (False, set()))
+
+    def test_table_ddl(self):
+        self.assertEqual(ddl_tables("CREATE TABLE IF NOT EXISTS t (id int)"), (True, {"t"}))
+        self.assertEqual(ddl_tables("ALTER TABLE t ADD COLUMN note text"), (True, {"t"}))
+        self.assertEqual(ddl_tables("DROP TABLE IF EXISTS a, b"), (True, {"a", "b"}))
+        self.assertEqual(ddl_tables("CREATE UNIQUE INDEX i ON t (c)"), (True, {"t"}))
+
+    def test_renames(self):
+        self.assertEqual(ddl_tables("ALTER TABLE a RENAME TO b"), (True, {"a", "b"}))
+        self.assertEqual(ddl_tables("RENAME TABLE a TO b, c TO d"), (True, {"a", "b", "c", "d"}))
+
+    def test_comments(self):
+        self.assertEqual(ddl_tables("COMMENT ON TABLE t IS 'x'"), (True, {"t"}))
+        self.assertEqual(ddl_tables("COMMENT ON COLUMN t.c IS 'x'"), (True, {"t"}))
+
+    def test_objects_outside_the_schema(self):
+        self.assertEqual(ddl_tables("CREATE OR REPLACE VIEW v AS SELECT 1"), (True, set()))
+        self.assertEqual(ddl_tables("DROP INDEX i"), (True, set()))
+
+    def test_unknown_targets(self):
+        self.assertEqual(ddl_tables("DROP SCHEMA s CASCADE"), (True, None))
+        self.assertEqual(ddl_tables("ALTER TYPE mood ADD VALUE 'meh'"), (True, None))
+
+    def test_scripts(self):
+        self.assertEqual(ddl_tables("CREATE TABLE t (id int); INSERT INTO t VALUES (1)"), (True, {"t"}))
+
+
+def schema_entry(columns):
+    """SchemaEntry of tables with the given number of columns each."""
+    table_info = {
+        name: f"CREATE TABLE {name} (\n" + ",\n".join(f"\t{name}_col{i} INTEGER" for i in range(count)) + "\n)"
+        for name, count in columns.items()
+    }
+    table_meta = {
+        name: {"columns": [f"{name}_col{i}" for i in range(count)], "comments": [], "foreign_keys": []}
+        for name, count in columns.items()
+    }
+    return SchemaEntry(sorted(table_info), table_info, table_meta, None)
+
+
+class SelectTablesTests(SimpleTestCase):
+
+    def test_whole_schema_when_it_fits(self):
+        entry = schema_entry({"orders": 3, "customer": 3})
+        self.assertEqual(select_tables(entry, "orders", token_budget=1000), (["customer", "orders"], entry.schema))
+
+    def test_table_larger_than_the_budget_is_truncated(self):
+        entry = schema_entry({"orders": 500, "customer": 3})
+        tables, schema = select_tables(entry, "orders", token_budget=100)
+        self.assertEqual(tables, ["orders"])
+        self.assertTrue(schema.startswith("CREATE TABLE orders"))
+        self.assertLessEqual(count_tokens(schema) + count_tokens("'orders', "), 100)
+
+
+class AssembleSQLPromptTests(SimpleTestCase):
+
+    def test_wide_table_stays_within_budget(self):
+        entry = schema_entry({"orders": 2000})
+        budget = frame_tokens() + 300
+        prompt, tables, tokens = assemble_sql_prompt(entry, "How many orders?", token_budget=budget)
+        self.assertEqual(tables, ["orders"])
+        self.assertIn("CREATE TABLE orders", prompt)
+        self.assertLessEqual(tokens, budget)
+        self.assertEqual(tokens, count_tokens(prompt))
+
+
+def page_engine(rows=30):
+    """In-memory SQLite engine with a table `t` of `rows` rows and a text key."""
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (code TEXT PRIMARY KEY, n INTEGER)"))
+        conn.execute(
+            text("INSERT INTO t VALUES (:code, :n)"),
+            [{"code": f"k{i:03d}", "n": i} for i in range(rows)],
+        )
+    return engine
+
+
+PAGE_ENTRY = SimpleNamespace(table_meta={"t": {"primary_key": ["code"], "columns": ["code", "n"]}})
+
+
+def read_all(engine, state):
+    """Rows of every page of `state`, following the page tokens."""
+    rows = []
+    while state is not None:
+        data, token = read_page(engine, state)
+        rows += data
+        state = decode_page_token(token) if token else None
+    return rows
+
+
+class PaginationTests(SimpleTestCase):
+
+    def test_page_size_is_clamped(self):
+        engine = page_engine()
+        self.assertEqual(paginate(engine, "SELECT * FROM t", PAGE_ENTRY, "7")["page_size"], 7)
+        self.assertEqual(paginate(engine, "SELECT * FROM t", PAGE_ENTRY, -2)["page_size"], 1)
+        self.assertEqual(paginate(engine, "SELECT * FROM t", PAGE_ENTRY, "x")["page_size"], settings.EXECUTE_PAGE_SIZE)
+
+    def test_keyset_pages(self):
+        engine = page_engine()
+        state = paginate(engine, "SELECT * FROM t -- every row", PAGE_ENTRY, 7)
+        self.assertEqual(state["keys"], ["code"])
+        rows = read_all(engine, state)
+        self.assertEqual([row["n"] for row in rows], list(range(30)))
+
+    def test_key_values_outside_json_keep_the_key_order(self):
+        engine = page_engine()
+        state = paginate(engine, "SELECT * FROM t", PAGE_ENTRY, 7)
+        with mock.patch("api.pagination.KEYSET_VALUE_TYPES", (int,)):
+            _, token = read_page(engine, state)
+            query, params = build_page_query(engine, decode_page_token(token))
+            self.assertIn("ORDER BY code", query)
+            self.assertEqual(params["_offset"], 7)
+            rows = read_all(engine, state)
+        self.assertEqual([row["n"] for row in rows], list(range(30)))
+
+    def test_offset_only_query_is_wrapped(self):
+        engine = page_engine()
+        state = paginate(engine, "SELECT * FROM t ORDER BY n OFFSET 10", PAGE_ENTRY, 7)
+        self.assertTrue(state["wrap"])
+        query, _ = build_page_query(engine, state)
+        self.assertTrue(query.startswith("SELECT * FROM (SELECT * FROM t ORDER BY n OFFSET 10) AS _page"))
+
+    def test_own_limit_is_kept(self):
+        engine = page_engine()
+        state = paginate(engine, "SELECT * FROM t ORDER BY n LIMIT 12", PAGE_ENTRY, 5)
+        self.assertEqual([row["n"] for row in read_all(engine, state)], list(range(12)))
+
+    def test_not_a_select(self):
+        self.assertIsNone(paginate(page_engine(), "DELETE FROM t", PAGE_ENTRY))
+
+    def test_tampered_token(self):
+        token = encode_page_token({"sql": "SELECT 1"})
+        with self.assertRaises(ValueError):
+            decode_page_token(token[:-2] + "xx")
+
+
+class AddLimitTests(SimpleTestCase):
+
+    def test_appends_limit(self):
+        self.assertEqual(add_limit("SELECT * FROM t;", 10), "SELECT * FROM t LIMIT 10")
+
+    def test_trailing_comment(self):
+        self.assertEqual(add_limit("SELECT * FROM t -- every row", 10), "SELECT * FROM t LIMIT 10")
+
+    def test_own_limit_or_not_a_select(self):
+        self.assertIsNone(add_limit("SELECT * FROM t LIMIT 5", 10))
+        self.assertIsNone(add_limit("SELECT * FROM t FETCH FIRST 5 ROWS ONLY", 10))
+        self.assertIsNone(add_limit("DELETE FROM t", 10))
+
+    def test_offset_only_query_is_wrapped(self):
+        self.assertEqual(
+            add_limit("SELECT * FROM t ORDER BY id OFFSET 10", 5),
+            "SELECT * FROM (SELECT * FROM t ORDER BY id OFFSET 10) AS _limited LIMIT 5",
+        )
+
+
+@override_settings(COST_GUARD_MAX_ROWS=100, COST_GUARD_MAX_COST=1000, COST_GUARD_LIMIT_ROWS=10)
+class GuardStatementTests(SimpleTestCase):
+
+    def guard(self, sql_query, rows, action, confirmed=False):
+        with override_settings(COST_GUARD_ACTION=action), \
+                mock.patch("api.cost_guard.estimate_cost", return_value={"rows": rows, "cost": 1.0}):
+            return guard_statement(None, sql_query, confirmed)
+
+    def test_under_threshold(self):
+        self.assertEqual(self.guard("SELECT * FROM t", 5, "reject"), ("SELECT * FROM t", {"rows": 5, "cost": 1.0}))
+
+    def test_reject(self):
+        with self.assertRaises(QueryCostExceeded) as raised:
+            self.guard("SELECT * FROM t", 500, "reject")
+        self.assertFalse(raised.exception.confirmable)
+
+    def test_limit(self):
+        self.assertEqual(
+            self.guard("SELECT * FROM t", 500, "limit"),
+            ("SELECT * FROM t LIMIT 10", {"rows": 500, "cost": 1.0, "limited_to": 10}),
+        )
+
+    def test_limit_falls_back_to_confirm(self):
+        with self.assertRaises(QueryCostExceeded) as raised:
+            self.guard("DELETE FROM t", 500, "limit")
+        self.assertTrue(raised.exception.confirmable)
+        self.assertEqual(self.guard("DELETE FROM t", 500, "limit", confirmed=True)[0], "DELETE FROM t")
+
+
+class IsReadQueryTests(SimpleTestCase):
+
+    def test_reads(self):
+        self.assertTrue(is_read_query("SELECT * FROM t"))
+        self.assertTrue(is_read_query("-- newest first\nSELECT * FROM t ORDER BY id DESC"))
+        self.assertTrue(is_read_query("/* x */ select 1;"))
+        self.assertTrue(is_read_query("WITH a AS (SELECT * FROM t) SELECT * FROM a"))
+        self.assertTrue(is_read_query("SHOW TABLES"))
+        self.assertTrue(is_read_query("EXPLAIN SELECT * FROM t"))
+
+    def test_writes(self):
+        self.assertFalse(is_read_query("DELETE FROM t"))
+        self.assertFalse(is_read_query("WITH d AS (DELETE FROM t RETURNING *) SELECT * FROM d"))
+        self.assertFalse(is_read_query("WITH a AS (SELECT 1) INSERT INTO t SELECT * FROM a"))
+        self.assertFalse(is_read_query("SELECT * INTO t2 FROM t"))
+        self.assertFalse(is_read_query("SELECT 1; DELETE FROM t"))
+
+
+class SplitStatementsTests(SimpleTestCase):
+
+    def test_semicolons_in_literals_and_comments(self):
+        self.assertEqual(
+            split_statements("INSERT INTO t VALUES ('a;b'); -- done; really\nUPDATE t SET x = 'c;';"),
+            ["INSERT INTO t VALUES ('a;b')", "UPDATE t SET x = 'c;'"],
+        )
+
+    def test_trailing_comment_does_not_block_coalescing(self):
+        statements = split_statements("INSERT INTO t VALUES (1); -- first\nINSERT INTO t VALUES (2);")
+        self.assertEqual(statements, ["INSERT INTO t VALUES (1)", "INSERT INTO t VALUES (2)"])
+        self.assertEqual(len(list(script_units(statements))), 1)
+
+    def test_transaction_control_is_dropped(self):
+        self.assertEqual(
+            split_statements("BEGIN; DELETE FROM t; COMMIT;"),
+            ["DELETE FROM t"],
+        )
+        self.assertEqual(
+            split_statements("START TRANSACTION; DELETE FROM t; END;"),
+            ["DELETE FROM t"],
+        )
+
+    def test_partial_rollbacks_are_rejected(self):
+        with self.assertRaises(ValueError):
+            split_statements("SAVEPOINT s; DELETE FROM t; ROLLBACK TO s;")
+
+
+class ScriptUnitsTests(SimpleTestCase):
+
+    def test_insert_shape(self):
+        self.assertEqual(
+            insert_shape("INSERT INTO t (a, b) VALUES (1, 'x;y'), (-2.5, NULL)"),
+            ("INSERT INTO t (a, b)", [[1, "x;y"], [decimal.Decimal("-2.5"), None]]),
+        )
+        self.assertIsNone(insert_shape("INSERT INTO t VALUES (now())"))
+        self.assertIsNone(insert_shape("INSERT INTO t SELECT * FROM u"))
+        self.assertIsNone(insert_shape("INSERT INTO t VALUES (1) ON CONFLICT DO NOTHING"))
+
+    def test_same_shaped_inserts_are_coalesced(self):
+        statements = split_statements(
+            "INSERT INTO t VALUES (1, 'a;'); INSERT INTO t VALUES (2, 'b'), (3, 'c');"
+            "UPDATE t SET b = 'd' WHERE a = 1; INSERT INTO t VALUES (4, 'e'); INSERT INTO u VALUES (5)"
+        )
+        self.assertEqual(list(script_units(statements)), [
+            ([0, 1], "INSERT INTO t", [[1, "a;"], [2, "b"], [3, "c"]], [1, 2]),
+            ([2], "UPDATE t SET b = 'd' WHERE a = 1", None, None),
+            ([3], "INSERT INTO t VALUES (4, 'e')", None, None),
+            ([4], "INSERT INTO u VALUES (5)", None, None),
+        ])
+
+    def test_script_runs_in_one_transaction(self):
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE t (a INTEGER PRIMARY KEY, b TEXT)"))
+        statements = split_statements(
+            "INSERT INTO t VALUES (1, 'x;'); INSERT INTO t VALUES (2, 'y'); SELECT b FROM t ORDER BY a"
+        )
+        data, report = execute_script(engine, statements)
+        self.assertEqual(data, [{"b": "x;"}, {"b": "y"}])
+        self.assertEqual([entry["rowcount"] for entry in report["statements"]], [1, 1, 2])
+        self.assertEqual(report["batches"], 1)
+
+        statements = split_statements("INSERT INTO t VALUES (3, 'z'); COMMIT; INSERT INTO t VALUES (1, 'dup')")
+        with self.assertRaises(ScriptError):
+            execute_script(engine, statements)
+        with engine.connect() as conn:
+            self.assertEqual(conn.execute(text("SELECT count(*) FROM t")).scalar(), 2)
+
+
+class SQLFenceStripperTests(SimpleTestCase):
+
+    def stream(self, chunks):
+        stripper = SQLFenceStripper()
+        return "".join(stripper.feed(chunk) for chunk in chunks) + stripper.finish()
+
+    def test_matches_clean_sql(self):
+        for text_ in ("```sql\nSELECT 1;\n```", "```\nSELECT 1;\n```", "  SELECT 1;  \n", ""):
+            self.assertEqual(self.stream([text_]), clean_sql(text_))
+
+    def test_fence_split_across_chunks(self):
+        text_ = "```sql\nSELECT * FROM t;\n```\n"
+        for size in (1, 2, 3, 5):
+            chunks = [text_[i:i + size] for i in range(0, len(text_), size)]
+            self.assertEqual(self.stream(chunks), "SELECT * FROM t;")
+
+    def test_plain_answer_is_not_held_back(self):
+        stripper = SQLFenceStripper()
+        self.assertEqual(stripper.feed("SELECT"), "SELECT")
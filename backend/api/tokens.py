@@ -0,0 +1,92 @@
+import threading
+
+from django.conf import settings
+
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """
+    tiktoken encoding named by PROMPT_TOKEN_ENCODING, loaded on first use.
+    Returns None when tiktoken or its BPE file is unavailable.
+    """
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(settings.PROMPT_TOKEN_ENCODING)
+                except Exception:
+                    _encoding_failed = True
+    return _encoding
+
+
+def count_tokens(text):
+    """Token count of `text`; about four characters per token without tiktoken."""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut `text` to at most `max_tokens` tokens."""
+    encoding = get_encoding()
+    if encoding is None:
+        if count_tokens(text) <= max_tokens:
+            return text
+        return text[:max(max_tokens - 1, 0) * 4]  # count_tokens rounds up
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    # A cut inside a word can re-encode to more tokens than were kept
+    keep = max_tokens
+    while keep > 0 and len(encoding.encode(encoding.decode(tokens[:keep]), disallowed_special=())) > max_tokens:
+        keep -= 1
+    return encoding.decode(tokens[:keep])
+
+
+class TokenUsage:
+    """Per-stage totals of LLM calls, input/output tokens and latency."""
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, input_tokens, output_tokens, latency_ms):
+        with self._lock:
+            totals = self._stages.setdefault(stage, {
+                "calls": 0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "latency_ms": 0.0,
+                "max_latency_ms": 0.0,
+            })
+            totals["calls"] += 1
+            totals["input_tokens"] += input_tokens
+            totals["output_tokens"] += output_tokens
+            totals["latency_ms"] += latency_ms
+            totals["max_latency_ms"] = max(totals["max_latency_ms"], latency_ms)
+
+    def stats(self):
+        with self._lock:
+            stats = {}
+            for stage, totals in self._stages.items():
+                calls = totals["calls"]
+                stats[stage] = {
+                    **totals,
+                    "latency_ms": round(totals["latency_ms"], 1),
+                    "avg_input_tokens": round(totals["input_tokens"] / calls, 1),
+                    "avg_output_tokens": round(totals["output_tokens"] / calls, 1),
+                    "avg_latency_ms": round(totals["latency_ms"] / calls, 1),
+                }
+            return stats
+
+
+token_usage = TokenUsage()
@@ -15,12 +15,27 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from .views import * 
+from .async_views import askdb_async, execute_db_async
 from django.urls import path  
 
 urlpatterns = [
    path('connect-db/' , connect_db , name='connect-db'),
    path('get-tables/' , get_tables , name='get-tables'),
+   path('refresh-schema/' , refresh_schema , name='refresh-schema'),
+   path('schema-status/' , schema_status , name='schema-status'),
    path('ask-db/' , askdb , name='ask-db'),
    path('execute-db/' , execute_db , name='execute-db'),
-   path('set-api-key/', set_api_key , name='set-api-key')
+   path('ask-db/stream/' , askdb_stream , name='ask-db-stream'),
+   path('ask-db/batch/' , askdb_batch , name='ask-db-batch'),
+   path('ask-and-execute/' , ask_and_execute , name='ask-and-execute'),
+   path('execute-db/stream/' , execute_db_stream , name='execute-db-stream'),
+   path('async/ask-db/' , askdb_async , name='ask-db-async'),
+   path('async/execute-db/' , execute_db_async , name='execute-db-async'),
+   path('export/' , export_query , name='export'),
+   path('fetch-page/' , fetch_page , name='fetch-page'),
+   path('set-api-key/', set_api_key , name='set-api-key'),
+   path('engine-stats/', engine_stats , name='engine-stats'),
+   path('cache-stats/', cache_stats , name='cache-stats'),
+   path('token-stats/', token_stats , name='token-stats'),
+   path('metrics/', metrics_view , name='metrics')
 ]
@@ -1,21 +1,32 @@
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.response import Response
-from .db_utils import build_connection_url, connect_database
-from langchain_google_genai import ChatGoogleGenerativeAI 
-from dotenv import load_dotenv 
-from langchain_community.utilities import SQLDatabase
-from langchain.prompts import PromptTemplate
-from sqlalchemy import text, inspect
+from .batch import generate_batch
+from .column_stats import column_profiler
+from .cost_guard import QueryCostExceeded, guard_query
+from .db_utils import build_connection_url
+from .engine_registry import engine_registry
+from .schema_cache import schema_cache
+from .execution import execute_query
+from .export import EXPORT_COMPRESSION, EXPORT_FORMATS, export_response, parquet_available
+from .llm import invoke_llm, llm_pool, stream_llm
+from .metrics import metrics, timed
+from .pagination import decode_page_token, read_page
+from .pipeline import elapsed_ms, generate_sql, run_pipeline
+from .renderers import ROW_RENDERERS
+from .prompts import SQLFenceStripper, assemble_sql_prompt, build_answer_prompt
+from .result_cache import result_cache
+from .result_digest import build_digest
+from .sql_cache import cache_key as sql_cache_key, sql_cache
+from .sql_utils import is_read_query
+from .streaming import STREAM_FORMATS, event_stream_response, sse_event, streaming_response
+from .tokens import token_usage
 import traceback
 
-load_dotenv()
-
-def get_llm(api_key):
-    return ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=api_key)
-
-connections = {}   # key = session_id, value = db_instance
-
 @api_view(['POST'])
 def connect_db(request):
     """
@@ -41,7 +52,6 @@ def connect_db(request):
          
         if not request.session.session_key:
             request.session.create()
-        session_id = request.session.session_key
 
         if "connection_string" in request.data:
             connection_url = request.data.get("connection_string")
@@ -66,17 +76,20 @@ def connect_db(request):
                 db_type, user, password, host, port, database
             )
 
-        # Connect to DB - this should return a SQLAlchemy engine or connection
-        db_instance = connect_database(connection_url)
+        # Connect to DB - engines are pooled and shared per connection URL
+        engine = engine_registry.register(request.session, connection_url)
 
-        # Save db_instance in dictionary under this session_id
-        connections[session_id] = db_instance
+        # Reflect the schema in the background so the first question finds it cached
+        schema_status = schema_cache.warm(engine) if settings.SCHEMA_WARMUP_ON_CONNECT else None
+        # ... and sample column statistics for the prompt once it is
+        if settings.COLUMN_STATS_ENABLED:
+            column_profiler.track(engine)
 
         return Response({
             "error": False,
             "status_code": 200,
             "message": "Database connected successfully!",
-            "data":{}
+            "data": {"schema_status": schema_status}
         }, status=200)
 
     except Exception as e:
@@ -96,8 +109,8 @@ def get_tables(request):
     """
     try:
        
-        session_id = request.session.session_key
-        if not session_id or session_id not in connections:
+        engine = engine_registry.engine_for(request.session)
+        if engine is None:
             return Response({
                 "error": True,
                 "status_code": 400,
@@ -105,17 +118,7 @@ def get_tables(request):
                 "data": None
             }, status=400)
 
-        db_instance = connections[session_id]
-        
-        # Force fresh table lookup by using SQLAlchemy inspector directly
-        if isinstance(db_instance, SQLDatabase):
-            # Use the engine from SQLDatabase and create fresh inspector
-            inspector = inspect(db_instance._engine)
-            tables = inspector.get_table_names()
-        else:
-            # Create fresh inspector from engine
-            inspector = inspect(db_instance)
-            tables = inspector.get_table_names()
+        tables = schema_cache.get(engine).tables
 
         return Response({
             "error": False,
@@ -134,6 +137,122 @@ def get_tables(request):
 
 
 
+@api_view(['POST'])
+def refresh_schema(request):
+    """
+    url:- refresh-schema/
+    doc :- Drop the cached schema of the connected database and reflect it again.
+    """
+    try:
+        engine = engine_registry.engine_for(request.session)
+        if engine is None:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "Database not connected. Please call connect-db first.",
+                "data": None
+            }, status=400)
+
+        entry = schema_cache.get(engine, force=True)
+
+        return Response({
+            "error": False,
+            "status_code": 200,
+            "message": "Schema refreshed successfully",
+            "data": {"tables": entry.tables}
+        }, status=200)
+
+    except Exception as e:
+        return Response({
+            "error": True,
+            "status_code": 500,
+            "message": f"Failed to refresh schema: {str(e)}",
+            "data": None
+        }, status=500)
+
+
+@api_view(['GET'])
+def schema_status(request):
+    """
+    url:- schema-status/
+    doc :- Progress of the schema reflection started by connect-db (or
+           refresh-schema): state (not_started, queued, running, ready,
+           failed), tables reflected so far out of the total, elapsed time
+           and the error of a failed run.
+    """
+    engine = engine_registry.engine_for(request.session)
+    if engine is None:
+        return Response({
+            "error": True,
+            "status_code": 400,
+            "message": "Database not connected. Please call connect-db first.",
+            "data": None
+        }, status=400)
+
+    return Response({
+        "error": False,
+        "status_code": 200,
+        "message": "Fetched schema status successfully",
+        "data": schema_cache.status(engine)
+    }, status=200)
+
+
+@api_view(['GET'])
+def engine_stats(request):
+    """
+    url:- engine-stats/
+    doc :- Open engines, bound sessions and pool usage of this worker.
+    """
+    return Response({
+        "error": False,
+        "status_code": 200,
+        "message": "Fetched engine stats successfully",
+        "data": engine_registry.stats()
+    }, status=200)
+
+
+@api_view(['GET'])
+def cache_stats(request):
+    """
+    url:- cache-stats/
+    doc :- Hit/miss counters of this worker's caches and LLM client pool.
+    """
+    return Response({
+        "error": False,
+        "status_code": 200,
+        "message": "Fetched cache stats successfully",
+        "data": {
+            "sql_cache": sql_cache.stats(),
+            "result_cache": result_cache.stats(),
+            "column_stats": column_profiler.stats(),
+            "llm_pool": llm_pool.stats()
+        }
+    }, status=200)
+
+
+def metrics_view(request):
+    """
+    url:- metrics/
+    doc :- Prometheus text exposition of this worker's request, stage, LLM,
+           token, row and cache metrics.
+    """
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@api_view(['GET'])
+def token_stats(request):
+    """
+    url:- token-stats/
+    doc :- LLM calls, input/output tokens and latency per stage on this worker.
+    """
+    return Response({
+        "error": False,
+        "status_code": 200,
+        "message": "Fetched token stats successfully",
+        "data": token_usage.stats()
+    }, status=200)
+
+
 SMALL_TALK = {
     # greetings
     "hi", "hello", "hey", "yo", "hola", "namaste", "sup", "good morning",
@@ -161,10 +280,11 @@ def askdb(request):
     url:- ask-db/
     doc :- User asks natural language question about their DB.
     payload: { "question": "What is the average percentage of students?" }
+    payload (optional): { "bypass_cache": true } to skip the generated-SQL cache.
     """
     try:  
-        session_id = request.session.session_key
-        if not session_id or session_id not in connections:
+        engine = engine_registry.engine_for(request.session)
+        if engine is None:
             return Response({
                 "error": True,
                 "status_code": 400,
@@ -206,128 +326,22 @@ def askdb(request):
         # ---------------------------
         # Normal SQL flow
         # ---------------------------
-        db_instance = connections[session_id]
-        
-        # Create a fresh SQLDatabase instance to ensure latest schema
-        if isinstance(db_instance, SQLDatabase):
-            db = SQLDatabase(db_instance._engine)
-        else:
-            db = SQLDatabase(db_instance)
-
-        # Force refresh of table info by creating new instance
-        db._get_sample_rows = lambda table_name: ""
-        schema = db.get_table_info()
-        tables = db.get_usable_table_names()
-
-        print(schema)
-        prompt_text = f"""
-You are an expert SQL query generator with analytical capabilities. Follow these rules precisely:
-## Pre-Analysis Phase
-Before generating any SQL query, you must:
-1. **Schema Analysis**: Examine all provided tables, their columns, data types, constraints, and relationships
-2. **Requirement Analysis**: Break down the user's request to understand what tables/columns are needed
-3. **Relationship Mapping**: Identify foreign key relationships and join requirements
-4. **Query Type Classification**: Determine if this is DDL (CREATE/ALTER/DROP), DML (INSERT/UPDATE/DELETE), or DQL (SELECT)
-5. **Validation Check**: Verify all referenced tables and columns exist in the provided schema
-## Core Rules
-### 1. Schema-First Approach
-- **ALWAYS** read the complete schema before generating SQL
-- Use **EXACT** table and column names from schema (no assumptions, no pluralization)
-- If schema shows `customer` table, use `customer` not `customers`
-- If column is `customerid`, use `customerid` not `customer_id`
-
-### 2. Foreign Key Handling
-- **Existing referenced table with PK**: Use the primary key column(s)
-  ```sql
-  -- If schema shows: customer(customerid PK, name, email)
-  FOREIGN KEY (customer_id) REFERENCES customer(customerid)
-  ```
-- **Existing referenced table without declared PK**: Use id-like column (customerid, customer_id, id)
-- **Missing referenced table**: Respond exactly: `"I don't have enough knowledge about that."`
-- **Create referenced table only when explicitly requested**
-### 3. DDL Commands (CREATE/ALTER/DROP)
-- **CREATE TABLE**: Include appropriate data types, constraints, and primary keys
-- **ALTER TABLE**: Specify exact modification (ADD COLUMN, DROP COLUMN, MODIFY, etc.)
-- **DROP TABLE**: Include CASCADE if foreign key dependencies exist
-- **Indexes**: Create appropriate indexes for foreign keys and frequently queried columns
-### 4. DML Commands (INSERT/UPDATE/DELETE)
-- **INSERT**: Use consistent formatting:
-  ```sql
-  INSERT INTO products (productid, product_name, category, price) 
-  VALUES (1, 'Laptop', 'Electronics', 999.99);
-  ```
-- **UPDATE**: Always include WHERE clause unless bulk update is explicitly requested
-- **DELETE**: Always include WHERE clause unless truncation is explicitly requested
-- **Batch Operations**: Generate multiple statements when appropriate
-### 5. DQL Commands (SELECT)
-- **Simple SELECT**: Use proper column selection and table references
-- **JOINs**: Use appropriate join types (INNER, LEFT, RIGHT, FULL OUTER)
-- **Aggregations**: Include proper GROUP BY and HAVING clauses
-- **Subqueries**: Use when complex filtering is needed
-- **Window Functions**: Apply for advanced analytics when appropriate
-### 6. Output Format
-- **SQL ONLY**: Output must be raw SQL query text
-- **No explanations, comments, or additional text**
-- **Proper formatting**: Use consistent indentation and line breaks for readability
-- **Semicolon termination**: End each statement with semicolon
-### 7. Error Handling
-- **No schema provided**: `"I don't have enough data to generate SQL query."`
-- **Schema provided but empty**: `"I don't have knowledge, please connect a proper database."`
-- **Unknown table/column referenced**: `"I don't have enough knowledge about that."`
-- **Ambiguous request**: `"I don't have enough knowledge about that."`
-### 8. Advanced Features
-- **Transactions**: Wrap related DML operations in BEGIN/COMMIT blocks when appropriate
-- **Constraints**: Add CHECK constraints, UNIQUE constraints as needed
-- **Data Types**: Choose appropriate data types based on context
-- **Performance**: Consider indexing strategies for large datasets
-## Analysis Framework
-Before generating SQL, mentally process:
-1. What tables are involved?
-2. What columns are needed?
-3. What relationships exist?
-4. What constraints apply?
-5. What is the expected output?
-## Example Workflow
-```
-User Request: "Create orders table with customer reference"
-Analysis:
-- DDL command (CREATE TABLE)
-- Need: orders table structure
-- Foreign key: customer reference
-- Check: customer table exists in schema?
-- PK: What's the customer table's primary key?
-- Generate: CREATE TABLE with proper foreign key
-```
-Remember: Think first, validate against schema, then generate precise SQL.
-{tables}
-
-Database Schema:
-{schema}
-
-User Question:
-{question}
-"""
-        
-        llm = get_llm(api_key)
-        response_llm = llm.invoke(prompt_text)
-        sql_query = response_llm.content.strip()
+        entry = schema_cache.get(engine)
 
-        
-        if sql_query.startswith("```sql"):
-            sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
-        elif sql_query.startswith("```"):
-            sql_query = sql_query.replace("```", "").strip()
+        # Reuses SQL generated earlier for the same question and schema
+        bypass_cache = bool(request.data.get("bypass_cache"))
+        sql_query, tables, cached, usage = generate_sql(api_key, entry, question, bypass_cache)
 
-        
-        request.session["last_question"] = question
-        request.session["last_query"] = sql_query
-        request.session.save()
+        with timed("session"):
+            request.session["last_question"] = question
+            request.session["last_query"] = sql_query
+            request.session.save()
 
         return Response({
             "error": False,
             "status_code": 200,
             "message": "SQL query generated successfully",
-            "data": {"query": sql_query}
+            "data": {"query": sql_query, "selected_tables": tables, "cached": cached, "usage": usage}
         }, status=200)
 
     except Exception as e:
@@ -342,16 +356,39 @@ User Question:
 
 
 @api_view(['POST'])
+@renderer_classes(ROW_RENDERERS)
 def execute_db(request):
     """
     url:- execute-db/
     doc :- Execute the last generated SQL query and return results in natural language.
+    payload (optional): { "stream": "ndjson" | "sse", "page_size": 100 }
+        stream: streams the rows of a read query from a server-side cursor in
+        chunks (capped at EXECUTE_STREAM_MAX_ROWS) instead of returning them in
+        one response. No natural language answer is generated in this mode.
+        page_size: SELECTs return only the first page (default
+        EXECUTE_PAGE_SIZE); pass "next_page" to fetch-page/ for the rest.
+    Accept: application/vnd.text2sql.columnar+json returns the rows as
+        {"columns": [...], "rows": [[...], ...]} rendered with orjson;
+        add "; layout=columns" for {"columns", "values": [[column], ...]}.
+    payload (optional): { "confirm": true }
+        confirm: run a query the cost guard flagged as expensive (409 with
+        the planner estimate). Queries it rejects outright return 400.
+    Scripts of several statements run in one transaction (same-shaped
+    INSERT ... VALUES runs are batched) and return "script": the rowcount
+    and time of every statement, the number of batches and the total time.
     """
     try:
-         
-        
-        session_id = request.session.session_key
-        if not session_id or session_id not in connections:
+        stream_format = request.data.get("stream")
+        if stream_format and stream_format not in STREAM_FORMATS:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "Unsupported stream format. Use 'ndjson' or 'sse'.",
+                "data": None
+            }, status=400)
+
+        engine = engine_registry.engine_for(request.session)
+        if engine is None:
             return Response({
                 "error": True,
                 "status_code": 400,
@@ -368,9 +405,12 @@ def execute_db(request):
                 "data": None
             }, status=400)
 
-        sql_query = request.session.pop("last_query", None)
-        user_question = request.session.pop("last_question", None)
-        request.session.save()
+        with timed("session"):
+            sql_query = request.session.pop("last_query", None)
+            user_question = request.session.pop("last_question", None)
+            if sql_query:
+                request.session["last_executed_query"] = sql_query
+            request.session.save()
         if not sql_query or not user_question:
             return Response({
                 "error": True,
@@ -378,52 +418,34 @@ def execute_db(request):
                 "message": "No query found. Please call ask-db first.",
                 "data": None
             }, status=400)
-                    
-        db_instance = connections[session_id]
-        
-        # Fix: Access engine correctly for SQLDatabase objects
-        if isinstance(db_instance, SQLDatabase):
-            engine = db_instance._engine  # SQLDatabase stores engine as _engine
-        else:
-            engine = db_instance
-            
-        with engine.connect() as conn:
-            result = conn.execute(text(sql_query))
-            if sql_query.strip().lower().startswith(("select", "show", "desc", "describe", "explain")):
-                rows = result.fetchall()
-                columns = result.keys()
-                data = [dict(zip(columns, row)) for row in rows]
-            else:
-                conn.commit()  # commit for INSERT/UPDATE/DELETE
-                data = None
-                rows = []       
-                columns = []    
-                 
-
-        data = [dict(zip(columns, row)) for row in rows]
-                
-        # Better prompt with "For your data..."
-        nl_prompt = f"""
-You are a helpful assistant that explains database query results in very simple and clear language.
-
-Context:
-- The user originally asked: "{user_question}"
-- The SQL query that was executed: {sql_query}
-- The raw database results: {data}
-
-Instructions:
-1. Always start your explanation with: "For your data, ..."
-2. Summarize the results in plain English, as if explaining to a non-technical person.
-3. Be clear and concise. Avoid technical SQL or database jargon.
-4. If the result has numbers (like counts, averages, percentages), highlight them clearly.
-5. If multiple rows are present, describe the key insights (not just listing them blindly).
-6. Keep the explanation friendly and easy to understand.
-
-Now give the explanation:
-"""
-        llm = get_llm(api_key)
-        response = llm.invoke(nl_prompt)
-        answer = response.content.strip()
+
+        # The planner's estimate decides whether the query may run as is
+        try:
+            sql_query, cost_estimate = guard_query(engine, sql_query, bool(request.data.get("confirm")))
+        except QueryCostExceeded as e:
+            if e.confirmable:
+                request.session["last_query"] = sql_query
+                request.session["last_question"] = user_question
+                request.session.save()
+            status = 409 if e.confirmable else 400
+            return Response({
+                "error": True,
+                "status_code": status,
+                "message": str(e),
+                "data": {"cost_estimate": e.estimate, "confirm_required": e.confirmable}
+            }, status=status)
+
+        if stream_format and is_read_query(sql_query):
+            return streaming_response(engine, sql_query, stream_format, cost_estimate)
+
+        data, next_page, script = execute_query(engine, sql_query, request.data.get("page_size"))
+
+        # The LLM gets a compact digest of the result, never the raw rows
+        digest = build_digest(data, more_rows=next_page is not None)
+
+        nl_prompt = build_answer_prompt(user_question, sql_query, digest)
+        answer, usage = invoke_llm(api_key, "explain", nl_prompt)
+        answer = answer.strip()
 
         return Response({
             "error": False,
@@ -431,7 +453,11 @@ Now give the explanation:
             "message": "Query executed successfully",
             "data": {
                 "rows": data,
-                "nl_answer": answer
+                "nl_answer": answer,
+                "next_page": next_page,
+                "script": script,
+                "cost_estimate": cost_estimate,
+                "usage": usage
             }
         }, status=200)
 
@@ -443,6 +469,517 @@ Now give the explanation:
             "data": None
         }, status=500)
 
+@api_view(['POST'])
+def askdb_batch(request):
+    """
+    url:- ask-db/batch/
+    doc :- Generate SQL for many questions at once. The schema is read once
+           and the LLM calls run concurrently (at most BATCH_CONCURRENCY, and
+           LLM_RATE_LIMIT_PER_MINUTE per API key), each retried with backoff.
+           Results are not stored as the session's last query.
+    payload: { "questions": ["How many students?", "Average percentage?"] }
+    payload (optional): { "concurrency": 4, "bypass_cache": true }
+    """
+    try:
+        engine = engine_registry.engine_for(request.session)
+        if engine is None:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "Database not connected. Please call connect-db first.",
+                "data": None
+            }, status=400)
+
+        api_key = request.session.get("api_key")
+        if not api_key:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "No API key found. Please set your API key first.",
+                "data": None
+            }, status=400)
+
+        questions = request.data.get("questions")
+        if (
+            not isinstance(questions, list) or not questions
+            or not all(isinstance(q, str) and q.strip() for q in questions)
+        ):
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "questions must be a non-empty list of questions",
+                "data": None
+            }, status=400)
+
+        if len(questions) > settings.BATCH_MAX_QUESTIONS:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": f"At most {settings.BATCH_MAX_QUESTIONS} questions per batch",
+                "data": None
+            }, status=400)
+
+        try:
+            concurrency = int(request.data.get("concurrency") or 0)
+        except (TypeError, ValueError):
+            concurrency = 0
+
+        started = time.perf_counter()
+        entry = schema_cache.get(engine)
+        pending = [q for q in questions if q.lower().strip() not in SMALL_TALK]
+        bypass_cache = bool(request.data.get("bypass_cache"))
+        generated = generate_batch(api_key, entry, pending, concurrency, bypass_cache) if pending else []
+
+        results = []
+        generated = iter(generated)
+        for question in questions:
+            if question.lower().strip() in SMALL_TALK:
+                results.append({
+                    "question": question,
+                    "query": None,
+                    "selected_tables": [],
+                    "cached": False,
+                    "error": "Not a database question",
+                    "attempts": 0,
+                    "usage": None,
+                    "latency_ms": 0.0
+                })
+            else:
+                results.append(next(generated))
+
+        failed = sum(1 for result in results if result["error"])
+        return Response({
+            "error": False,
+            "status_code": 200,
+            "message": "Batch processed successfully",
+            "data": {
+                "results": results,
+                "succeeded": len(results) - failed,
+                "failed": failed,
+                "total_ms": elapsed_ms(started)
+            }
+        }, status=200)
+
+    except Exception as e:
+        return Response({
+            "error": True,
+            "status_code": 500,
+            "message": f"Failed to process batch: {str(e)}",
+            "data": None
+        }, status=500)
+
+
+@api_view(['POST'])
+def askdb_stream(request):
+    """
+    url:- ask-db/stream/
+    doc :- Same as ask-db/, but the generated SQL is streamed as Server-Sent
+           Events while the model writes it, with ```sql fences stripped on
+           the fly.
+    payload: { "question": "What is the average percentage of students?" }
+    events: token {"text"} ..., then done {"query", "selected_tables", "cached"}
+            or error {"message"}
+    """
+    try:
+        engine = engine_registry.engine_for(request.session)
+        if engine is None:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "Database not connected. Please call connect-db first.",
+                "data": None
+            }, status=400)
+
+        api_key = request.session.get("api_key")
+        if not api_key:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "No API key found. Please set your API key first.",
+                "data": None
+            }, status=400)
+
+        question = request.data.get("question")
+        if not question:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "Missing question field",
+                "data": None
+            }, status=400)
+
+        if question.lower().strip() in SMALL_TALK:
+            return Response({
+                "error": False,
+                "status_code": 200,
+                "message": "Acknowledged",
+                "data": None
+            }, status=200)
+
+        entry = schema_cache.get(engine)
+        prompt, tables, _ = assemble_sql_prompt(entry, question)
+
+        cache_key = sql_cache_key(question, entry)
+        bypass_cache = bool(request.data.get("bypass_cache"))
+        cached_query = None if bypass_cache else sql_cache.get(cache_key)
+
+        def events():
+            try:
+                if cached_query is not None:
+                    sql_query = cached_query
+                    yield sse_event("token", {"text": sql_query})
+                else:
+                    stripper = SQLFenceStripper()
+                    parts = []
+                    for chunk in stream_llm(api_key, "generate_sql", prompt):
+                        text = stripper.feed(chunk)
+                        if text:
+                            parts.append(text)
+                            yield sse_event("token", {"text": text})
+                    text = stripper.finish()
+                    if text:
+                        parts.append(text)
+                        yield sse_event("token", {"text": text})
+                    sql_query = "".join(parts)
+                    if sql_query:
+                        sql_cache.set(cache_key, question, sql_query)
+
+                request.session["last_question"] = question
+                request.session["last_query"] = sql_query
+                request.session.save()
+
+                yield sse_event("done", {
+                    "query": sql_query,
+                    "selected_tables": tables,
+                    "cached": cached_query is not None
+                })
+            except Exception as e:
+                traceback.print_exc()
+                yield sse_event("error", {"message": f"Failed to process question: {str(e)}"})
+
+        return event_stream_response(events())
+
+    except Exception as e:
+        return Response({
+            "error": True,
+            "status_code": 500,
+            "message": f"Failed to process question: {str(e)}",
+            "data": None
+        }, status=500)
+
+
+@api_view(['POST'])
+def execute_db_stream(request):
+    """
+    url:- execute-db/stream/
+    doc :- Same as execute-db/, but the natural language answer is streamed
+           as Server-Sent Events. The rows are sent first, as soon as the
+           query has run.
+    payload (optional): { "page_size": 100, "confirm": true }
+    events: rows {"rows", "next_page"}, token {"text"} ..., then
+            done {"nl_answer", "cost_estimate"} or error {"message"}
+    """
+    try:
+        engine = engine_registry.engine_for(request.session)
+        if engine is None:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "Database not connected. Please call connect-db first.",
+                "data": None
+            }, status=400)
+
+        api_key = request.session.get("api_key")
+        if not api_key:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "No API key found. Please set your API key first.",
+                "data": None
+            }, status=400)
+
+        with timed("session"):
+            sql_query = request.session.pop("last_query", None)
+            user_question = request.session.pop("last_question", None)
+            if sql_query:
+                request.session["last_executed_query"] = sql_query
+            request.session.save()
+        if not sql_query or not user_question:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "No query found. Please call ask-db first.",
+                "data": None
+            }, status=400)
+
+        # The planner's estimate decides whether the query may run as is
+        try:
+            sql_query, cost_estimate = guard_query(engine, sql_query, bool(request.data.get("confirm")))
+        except QueryCostExceeded as e:
+            if e.confirmable:
+                request.session["last_query"] = sql_query
+                request.session["last_question"] = user_question
+                request.session.save()
+            status = 409 if e.confirmable else 400
+            return Response({
+                "error": True,
+                "status_code": status,
+                "message": str(e),
+                "data": {"cost_estimate": e.estimate, "confirm_required": e.confirmable}
+            }, status=status)
+
+        page_size = request.data.get("page_size")
+
+        def events():
+            try:
+                data, next_page, script = execute_query(engine, sql_query, page_size)
+                yield sse_event("rows", {"rows": data, "next_page": next_page, "script": script})
+
+                digest = build_digest(data, more_rows=next_page is not None)
+                parts = []
+                for chunk in stream_llm(api_key, "explain", build_answer_prompt(user_question, sql_query, digest)):
+                    parts.append(chunk)
+                    yield sse_event("token", {"text": chunk})
+
+                yield sse_event("done", {"nl_answer": "".join(parts).strip(), "cost_estimate": cost_estimate})
+            except Exception as e:
+                yield sse_event("error", {"message": f"Failed to execute query: {str(e)}"})
+
+        return event_stream_response(events())
+
+    except Exception as e:
+        return Response({
+            "error": True,
+            "status_code": 500,
+            "message": f"Failed to execute query: {str(e)}",
+            "data": None
+        }, status=500)
+
+
+@api_view(['POST'])
+def ask_and_execute(request):
+    """
+    url:- ask-and-execute/
+    doc :- Generate SQL for a read-only question, run it and explain it in a
+           single call. Rows are streamed as Server-Sent Events while the
+           explanation is generated concurrently; the done event carries the
+           timing of each stage.
+    payload: { "question": "What is the average percentage of students?" }
+    payload (optional): { "confirm": true } to run a query the cost guard
+        flagged as expensive.
+    """
+    try:
+        engine = engine_registry.engine_for(request.session)
+        if engine is None:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "Database not connected. Please call connect-db first.",
+                "data": None
+            }, status=400)
+
+        api_key = request.session.get("api_key")
+        if not api_key:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "No API key found. Please set your API key first.",
+                "data": None
+            }, status=400)
+
+        question = request.data.get("question")
+        if not question:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "Missing question field",
+                "data": None
+            }, status=400)
+
+        if question.lower().strip() in SMALL_TALK:
+            return Response({
+                "error": False,
+                "status_code": 200,
+                "message": "Acknowledged",
+                "data": None
+            }, status=200)
+
+        entry = schema_cache.get(engine)
+        bypass_cache = bool(request.data.get("bypass_cache"))
+        confirmed = bool(request.data.get("confirm"))
+        return event_stream_response(
+            run_pipeline(engine, api_key, entry, question, bypass_cache, confirmed)
+        )
+
+    except Exception as e:
+        return Response({
+            "error": True,
+            "status_code": 500,
+            "message": f"Failed to run pipeline: {str(e)}",
+            "data": None
+        }, status=500)
+
+
+@api_view(['POST'])
+@renderer_classes(ROW_RENDERERS)
+def fetch_page(request):
+    """
+    url:- fetch-page/
+    doc :- Fetch the next page of a query run through execute-db. Supports
+           the same columnar Accept format as execute-db.
+    payload: { "page_token": "<next_page from execute-db or fetch-page>" }
+    """
+    try:
+        engine = engine_registry.engine_for(request.session)
+        if engine is None:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "Database not connected. Please call connect-db first.",
+                "data": None
+            }, status=400)
+
+        token = request.data.get("page_token")
+        if not token:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "Missing page_token field",
+                "data": None
+            }, status=400)
+
+        try:
+            state = decode_page_token(token)
+        except ValueError as e:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": str(e),
+                "data": None
+            }, status=400)
+
+        data, next_page = read_page(engine, state)
+
+        return Response({
+            "error": False,
+            "status_code": 200,
+            "message": "Fetched page successfully",
+            "data": {
+                "rows": data,
+                "next_page": next_page
+            }
+        }, status=200)
+
+    except Exception as e:
+        return Response({
+            "error": True,
+            "status_code": 500,
+            "message": f"Failed to fetch page: {str(e)}",
+            "data": None
+        }, status=500)
+
+
+@api_view(['POST'])
+def export_query(request):
+    """
+    url:- export/
+    doc :- Download the result of the last query run through execute-db (or
+           of the given read-only "sql") as CSV or Parquet. Rows are streamed
+           from a server-side cursor in EXPORT_CHUNK_SIZE batches.
+    payload (optional): { "sql": "SELECT ...", "format": "csv" | "parquet",
+                          "max_rows": 50000, "compression": "gzip", "confirm": true }
+        max_rows: a positive number, capped at EXPORT_MAX_ROWS.
+        compression: "gzip" for CSV; "snappy", "gzip" or "zstd" for Parquet.
+        Parquet needs pyarrow to be installed.
+    """
+    try:
+        engine = engine_registry.engine_for(request.session)
+        if engine is None:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "Database not connected. Please call connect-db first.",
+                "data": None
+            }, status=400)
+
+        fmt = request.data.get("format") or "csv"
+        if fmt not in EXPORT_FORMATS:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "Unsupported export format. Use 'csv' or 'parquet'.",
+                "data": None
+            }, status=400)
+
+        if fmt == "parquet" and not parquet_available():
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "Parquet export is not available on this server (pyarrow is not installed).",
+                "data": None
+            }, status=400)
+
+        compression = request.data.get("compression") or None
+        if compression not in EXPORT_COMPRESSION[fmt]:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": f"Unsupported compression for {fmt}.",
+                "data": None
+            }, status=400)
+
+        max_rows = request.data.get("max_rows")
+        if max_rows is not None:
+            try:
+                max_rows = int(max_rows)
+            except (TypeError, ValueError):
+                max_rows = 0
+            if max_rows <= 0:
+                return Response({
+                    "error": True,
+                    "status_code": 400,
+                    "message": "max_rows must be a positive number.",
+                    "data": None
+                }, status=400)
+
+        sql_query = request.data.get("sql") or request.session.get("last_executed_query")
+        if not sql_query:
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "No query to export. Run one through execute-db or pass sql.",
+                "data": None
+            }, status=400)
+
+        if not is_read_query(sql_query):
+            return Response({
+                "error": True,
+                "status_code": 400,
+                "message": "Only read-only queries can be exported.",
+                "data": None
+            }, status=400)
+
+        try:
+            sql_query, cost_estimate = guard_query(engine, sql_query, bool(request.data.get("confirm")))
+        except QueryCostExceeded as e:
+            status = 409 if e.confirmable else 400
+            return Response({
+                "error": True,
+                "status_code": status,
+                "message": str(e),
+                "data": {"cost_estimate": e.estimate, "confirm_required": e.confirmable}
+            }, status=status)
+
+        return export_response(engine, sql_query, fmt, max_rows, compression, cost_estimate)
+
+    except Exception as e:
+        return Response({
+            "error": True,
+            "status_code": 500,
+            "message": f"Failed to export query: {str(e)}",
+            "data": None
+        }, status=500)
+
 @api_view(['POST'])
 def set_api_key(request):
     """
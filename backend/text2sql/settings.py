@@ -10,8 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
+load_dotenv()
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -43,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.ServerTimingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -132,6 +138,7 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+CORS_EXPOSE_HEADERS = ["Server-Timing", "X-Row-Limit", "X-Cost-Estimate"]
 
 
 SESSION_COOKIE_SECURE = True          # comment when  using on localhost
@@ -140,3 +147,184 @@ SESSION_COOKIE_SAMESITE = 'None'      # comment when using on  localhost
 CSRF_COOKIE_SECURE = True             # comment when using on  localhost 
 CSRF_COOKIE_SAMESITE = 'None'         # comment when using on  localhost 
 
+
+# Schema cache (api/schema_cache.py)
+# Rendered schemas are rebuilt after SCHEMA_CACHE_TTL seconds, or sooner when
+# the catalog fingerprint changes. The fingerprint query runs at most once per
+# SCHEMA_CACHE_CHECK_INTERVAL seconds per connection.
+SCHEMA_CACHE_TTL = 600
+SCHEMA_CACHE_CHECK_INTERVAL = 5
+
+
+# Schema retrieval (api/schema_retrieval.py)
+# When the full schema is larger than SCHEMA_RETRIEVAL_TOKEN_BUDGET, only the
+# SCHEMA_RETRIEVAL_TOP_K most relevant tables (plus their foreign-key
+# neighbours, budget permitting) are sent to the LLM.
+SCHEMA_RETRIEVAL_TOP_K = 8
+SCHEMA_RETRIEVAL_TOKEN_BUDGET = 6000
+
+
+# Connection pooling (api/db_utils.py, api/engine_registry.py)
+# One pooled engine is shared by every session connected to the same URL.
+DB_POOL_SIZE = 5
+DB_POOL_MAX_OVERFLOW = 10
+DB_POOL_TIMEOUT = 30
+DB_POOL_RECYCLE = 1800
+DB_POOL_PRE_PING = True
+# Server-side limit on every statement run over a pooled connection, in
+# milliseconds (PostgreSQL statement_timeout, MySQL max_execution_time,
+# which covers SELECTs only). 0 disables it.
+DB_STATEMENT_TIMEOUT_MS = 30000
+
+# Engines idle for ENGINE_REGISTRY_IDLE_TTL seconds, or beyond the
+# ENGINE_REGISTRY_MAX_ENGINES most recently used, are disposed. Decrypted
+# session bindings are cached per worker for ENGINE_REGISTRY_SESSION_TTL.
+ENGINE_REGISTRY_MAX_ENGINES = 32
+ENGINE_REGISTRY_IDLE_TTL = 1800
+ENGINE_REGISTRY_SESSION_TTL = 1800
+
+# Connection descriptors are stored encrypted in the session so any worker can
+# rebuild the engine. Falls back to SECRET_KEY when unset; all workers and
+# nodes must share the same key and session backend.
+CONNECTION_ENCRYPTION_KEY = os.environ.get("CONNECTION_ENCRYPTION_KEY")
+
+
+# Streaming execute-db (api/streaming.py)
+# Rows are fetched from a server-side cursor EXECUTE_STREAM_CHUNK_SIZE at a
+# time; the stream stops after EXECUTE_STREAM_MAX_ROWS rows.
+EXECUTE_STREAM_CHUNK_SIZE = 500
+EXECUTE_STREAM_MAX_ROWS = 100000
+
+
+# Pagination of executed SELECTs (api/pagination.py)
+# A LIMIT of EXECUTE_PAGE_SIZE rows is injected into SELECTs and the rest is
+# fetched through fetch-page/ with the returned continuation token.
+EXECUTE_PAGE_SIZE = 1000
+EXECUTE_MAX_PAGE_SIZE = 10000
+EXECUTE_PAGE_TOKEN_MAX_AGE = 60 * 60
+
+
+# Result digest for the NL answer (api/result_digest.py)
+# Instead of the raw rows, the LLM gets per-column statistics, the top
+# RESULT_DIGEST_TOP_K values and RESULT_DIGEST_SAMPLE_ROWS sample rows,
+# trimmed to RESULT_DIGEST_TOKEN_BUDGET tokens.
+RESULT_DIGEST_TOKEN_BUDGET = 1500
+RESULT_DIGEST_SAMPLE_ROWS = 10
+RESULT_DIGEST_TOP_K = 5
+
+
+# Question-to-SQL cache (api/sql_cache.py)
+# Generated SQL is reused for the same normalized question against the same
+# schema. SQL_CACHE_PERSISTENT also stores entries in the Django database.
+SQL_CACHE_TTL = 60 * 60 * 24
+SQL_CACHE_MAX_ENTRIES = 1000
+SQL_CACHE_PERSISTENT = True
+
+
+# Async endpoints (api/async_views.py)
+# Size of the thread pool that runs blocking database work for async views.
+ASYNC_DB_THREADS = 16
+
+
+# LLM client pool (api/llm.py)
+# Chat clients are reused per API key within a worker.
+LLM_POOL_MAX_CLIENTS = 64
+LLM_POOL_IDLE_TTL = 1800
+
+
+# Ask-and-execute pipeline (api/pipeline.py)
+# Threads that generate explanations while rows are being streamed.
+PIPELINE_EXPLAIN_THREADS = 8
+
+
+# Prompt assembly and token accounting (api/prompts.py, api/tokens.py)
+# The SQL prompt (instructions, schema and question) is kept within
+# PROMPT_TOKEN_BUDGET tokens, counted with the PROMPT_TOKEN_ENCODING
+# tiktoken encoding.
+PROMPT_TOKEN_BUDGET = 12000
+PROMPT_TOKEN_ENCODING = "cl100k_base"
+
+
+# Cost guard (api/cost_guard.py)
+# Generated statements are EXPLAINed (PostgreSQL and MySQL) before they run.
+# When the planner estimates more than COST_GUARD_MAX_ROWS rows or a cost
+# above COST_GUARD_MAX_COST, COST_GUARD_ACTION decides what happens:
+# "reject", "limit" (SELECTs get LIMIT COST_GUARD_LIMIT_ROWS, anything else
+# needs confirmation) or "confirm" (runs only when the request is repeated
+# with "confirm": true).
+COST_GUARD_ENABLED = True
+COST_GUARD_MAX_ROWS = 1_000_000
+COST_GUARD_MAX_COST = 10_000_000
+COST_GUARD_ACTION = "limit"
+COST_GUARD_LIMIT_ROWS = 10000
+
+
+# Result cache (api/result_cache.py)
+# Results of read queries run through execute-db are reused for the same
+# connection and canonical SQL for RESULT_CACHE_TTL seconds. Any other
+# statement run through execute-db drops the entries of the tables it
+# touches. Results over RESULT_CACHE_MAX_ROWS rows are not cached.
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_TTL = 60
+RESULT_CACHE_MAX_ENTRIES = 256
+RESULT_CACHE_MAX_ROWS = 10000
+# Writes bump per-table counters in the Django database that every worker
+# checks before serving a cached result, so invalidation is not per worker.
+RESULT_CACHE_SHARED_INVALIDATION = True
+
+
+# Batch questions (api/batch.py)
+# ask-db/batch/ accepts up to BATCH_MAX_QUESTIONS questions and runs up to
+# BATCH_CONCURRENCY LLM calls at a time. Failed calls are retried up to
+# BATCH_MAX_ATTEMPTS times with exponential backoff (BATCH_RETRY_BACKOFF
+# seconds, doubling, capped at BATCH_RETRY_MAX_WAIT).
+BATCH_MAX_QUESTIONS = 50
+BATCH_CONCURRENCY = 8
+BATCH_MAX_ATTEMPTS = 3
+BATCH_RETRY_BACKOFF = 1
+BATCH_RETRY_MAX_WAIT = 10
+
+# Per-API-key limit on batch LLM calls (api/llm.py); 0 disables it.
+LLM_RATE_LIMIT_PER_MINUTE = 60
+LLM_RATE_LIMIT_BURST = 10
+
+
+# Result export (api/export.py)
+# export/ streams CSV or Parquet in EXPORT_CHUNK_SIZE-row batches and stops
+# after EXPORT_MAX_ROWS rows. Parquet needs pyarrow, which is optional.
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_MAX_ROWS = 1_000_000
+
+
+# Startup (api/preload.py)
+# LangChain/Gemini, NumPy, tiktoken and pyarrow are imported on first use.
+# Set PRELOAD_HEAVY_MODULES=1 (e.g. with gunicorn --preload) to import them
+# when the app loads instead, so forked workers share them.
+PRELOAD_HEAVY_MODULES = os.environ.get("PRELOAD_HEAVY_MODULES", "") == "1"
+
+
+# Schema reflection and warm-up (api/schema_cache.py)
+# connect-db starts reflecting the schema in the background so the first
+# question finds it cached. Tables are reflected in batches of
+# SCHEMA_REFLECT_BATCH_SIZE on SCHEMA_REFLECT_THREADS threads.
+SCHEMA_WARMUP_ON_CONNECT = True
+SCHEMA_WARMUP_THREADS = 2
+SCHEMA_REFLECT_THREADS = 4
+SCHEMA_REFLECT_BATCH_SIZE = 25
+
+
+# Column statistics in the SQL prompt (api/column_stats.py)
+# After connect-db, tables are sampled in the background (TABLESAMPLE SYSTEM
+# on large PostgreSQL tables, LIMIT scans elsewhere) for null ratios, ranges
+# and the values of enum-like columns (at most COLUMN_STATS_MAX_VALUES). The
+# cached summary follows each table's DDL in the prompt. Statistics are
+# re-sampled after COLUMN_STATS_REFRESH seconds, checked every
+# COLUMN_STATS_CHECK_INTERVAL seconds.
+COLUMN_STATS_ENABLED = True
+COLUMN_STATS_IN_PROMPT = True
+COLUMN_STATS_SAMPLE_ROWS = 10000
+COLUMN_STATS_MAX_VALUES = 10
+COLUMN_STATS_MAX_VALUE_LENGTH = 40
+COLUMN_STATS_REFRESH = 6 * 60 * 60
+COLUMN_STATS_CHECK_INTERVAL = 60
+COLUMN_STATS_THREADS = 2
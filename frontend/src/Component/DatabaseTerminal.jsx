@@ -283,6 +283,36 @@ const DatabaseTerminal = () => {
     }
   }
 
+  // Fetch the next page of a result and append it to that result's rows
+  const loadMoreRows = async (messageIndex) => {
+    const nextPage = messages[messageIndex]?.data?.next_page
+    if (!nextPage) return
+
+    setIsLoading(true)
+
+    try {
+      const response = await axios.post(
+        "http://localhost:8000/fetch-page/",
+        { page_token: nextPage },
+        { withCredentials: true, headers: { "Content-Type": "application/json" } }
+      )
+
+      const page = response.data.data
+      setMessages((prev) =>
+        prev.map((message, index) =>
+          index === messageIndex
+            ? { ...message, data: { ...message.data, rows: [...message.data.rows, ...page.rows], next_page: page.next_page } }
+            : message
+        )
+      )
+    } catch (error) {
+      const errorMessage = error.response?.data?.message || error.response?.data?.error || error.message || "Unknown error"
+      addMessage({ type: "error", content: `⚠️ Failed to load more rows: ${errorMessage}` })
+    } finally {
+      setIsLoading(false)
+    }
+  }
+
   // Input handlers
   const handleInputSubmit = () => {
     if (currentInput.trim() && !isLoading) {
@@ -345,7 +375,12 @@ const DatabaseTerminal = () => {
           isRefreshing={isRefreshingTables}
         />
 
-        <TerminalOutput messages={messages} isLoading={isLoading} onExecuteQuery={executeQuery} />
+        <TerminalOutput
+          messages={messages}
+          isLoading={isLoading}
+          onExecuteQuery={executeQuery}
+          onLoadMoreRows={loadMoreRows}
+        />
 
         <InputArea
           connectionStatus={connectionStatus}
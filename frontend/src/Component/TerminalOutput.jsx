@@ -1,7 +1,7 @@
 import { useEffect, useRef, useState } from "react"
-import { Play, Loader2, Bot, User, AlertCircle, CheckCircle2, Terminal, Database, AlertTriangle, Sparkles, Copy, Check } from "lucide-react"
+import { Play, Loader2, Bot, User, AlertCircle, CheckCircle2, Terminal, Database, AlertTriangle, Sparkles, Copy, Check, ChevronsDown } from "lucide-react"
 
-export const TerminalOutput = ({ messages, isLoading, onExecuteQuery }) => {
+export const TerminalOutput = ({ messages, isLoading, onExecuteQuery, onLoadMoreRows }) => {
   const messagesEndRef = useRef(null)
   const [copiedMessageId, setCopiedMessageId] = useState(null)
 
@@ -109,7 +109,9 @@ export const TerminalOutput = ({ messages, isLoading, onExecuteQuery }) => {
               {message.type === "result" && message.data && message.data.rows && (
                 <div className="mt-2 p-3 bg-gray-800 border border-gray-600 rounded text-xs">
                   <div className="flex items-center justify-between mb-2">
-                    <div className="text-gray-400">📊 Raw Data:</div>
+                    <div className="text-gray-400">
+                      📊 Raw Data ({message.data.rows.length} rows{message.data.next_page ? ", more available" : ""}):
+                    </div>
                     <button
                       onClick={() => copyToClipboard(message.data.rows, index)}
                       className="flex items-center gap-1 px-2 py-1 bg-blue-700 hover:bg-blue-600 rounded text-xs font-semibold transition-colors"
@@ -131,6 +133,16 @@ export const TerminalOutput = ({ messages, isLoading, onExecuteQuery }) => {
                   <pre className="text-green-300 whitespace-pre-wrap overflow-x-auto">
                     {JSON.stringify(message.data.rows, null, 2)}
                   </pre>
+                  {message.data.next_page && (
+                    <button
+                      onClick={() => onLoadMoreRows(index)}
+                      disabled={isLoading}
+                      className="mt-2 px-3 py-1 bg-blue-700 hover:bg-blue-600 disabled:bg-gray-700 rounded flex items-center gap-1 text-xs font-semibold transition-colors"
+                    >
+                      <ChevronsDown size={12} />
+                      Load more rows
+                    </button>
+                  )}
                 </div>
               )}
             </div>